@@ -2,25 +2,25 @@
 
 import pandas as pd
 import numpy as np
-import mplfinance as mpf
+from numpy.lib.stride_tricks import sliding_window_view
 import os
+import logging
 from datetime import datetime
-from logger import logger
-from functools import wraps
+from logger import logger, log_debug
+from functools import lru_cache
+from collections import OrderedDict
+from engine import simulate
+from strategy import Strategy
 import json
 
-def log_debug(func):
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        logger.debug(f"Entering {func.__name__}")
-        try:
-            result = func(*args, **kwargs)
-            logger.debug(f"Exiting {func.__name__}")
-            return result
-        except Exception as e:
-            logger.exception(f"Exception in {func.__name__}")
-            raise
-    return wrapper
+@lru_cache(maxsize=1)
+def _load_config(path, mtime):
+    """
+    Parse the JSON config file. The modification time is part of the cache key, so an
+    edited file is read again.
+    """
+    with open(path, "r") as config_file:
+        return json.load(config_file)
 
 class Backtester:
     def __init__(self, data, strategy, initial_capital, trade_fee, investment_fraction, from_optimize=False, debug=False):
@@ -40,22 +40,51 @@ class Backtester:
         self.capital = initial_capital  # Current capital, updated with reinvested profits
         self.trade_fee = trade_fee
         self.investment_fraction = investment_fraction  # Fraction of capital to invest per trade
-        self.trades = []
+        # Trades are stored column-wise (one array per field)
+        self._trade_ids = np.empty(0, dtype=np.int64)
+        self._entry_idx = np.empty(0, dtype=np.int64)  # Positions in self.data
+        self._exit_idx = np.empty(0, dtype=np.int64)
+        self._entry_price = np.empty(0, dtype=np.float64)
+        self._exit_price = np.empty(0, dtype=np.float64)
+        self._shares = np.empty(0, dtype=np.float64)
+        self._profit = np.empty(0, dtype=np.float64)
+        self._fees = np.empty(0, dtype=np.float64)  # Entry + exit fee paid per trade
+        self._entry_time = np.empty(0, dtype='datetime64[ns]')
+        self._exit_time = np.empty(0, dtype='datetime64[ns]')
         self.final_capital = initial_capital
         self.from_optimize = from_optimize  # Store the flag
         self.debug = debug
         self.trade_id = 0  # Added to track trade IDs
 
-        # Load configuration
-        with open("config.json", "r") as config_file:
-            self.config = json.load(config_file)
+        # Load configuration (parsed once per file version, shared read-only between backtests)
+        self.config = _load_config("config.json", os.path.getmtime("config.json"))
         self.spread = self.config["general"].get("spread", 0.00015) # Default 0.015%
         self.slippage = self.config["general"].get("slippage", 0.0001)  # Default 0.01%
 
+    @property
+    def trades(self):
+        """
+        Trades as a list of dictionaries, built on demand from the trade arrays.
+        """
+        return [
+            {
+                'trade_id': int(self._trade_ids[k]),
+                'entry_price': float(self._entry_price[k]),
+                'entry_time': pd.Timestamp(self._entry_time[k]),
+                'shares': float(self._shares[k]),
+                'exit_price': float(self._exit_price[k]),
+                'exit_time': pd.Timestamp(self._exit_time[k]),
+                'profit': float(self._profit[k])
+            }
+            for k in range(len(self._profit))
+        ]
+
     @log_debug
     def run(self):
         """
-        Execute the backtest by iterating through the data with spread and slippage.
+        Execute the backtest with spread and slippage.
+        Signals are computed once over the whole DataFrame and the trade walk runs in
+        the compiled engine.simulate kernel.
         """
         logger.info("Starting backtest. Initial capital: %s, Spread: %s, Slippage: %s", 
                     self.initial_capital, self.spread, self.slippage)
@@ -63,71 +92,47 @@ class Backtester:
             logger.error("Data is empty. Cannot run backtest.")
             raise ValueError("Data is empty. Cannot run backtest.")
 
-        position = None
-        for i, row in self.data.iterrows():
-            logger.debug("Processing row at index: %s", row.name)
-            try:
-                # Check for entry signal
-                if position is None:
-                    entry_signal = self.strategy.entry_signal(row, self.data)
-                    if entry_signal:
-                        logger.info("Entry signal detected at %s. Base price: %s", row.name, row['Close'])
-                        self.trade_id += 1
-                        # Apply spread and slippage to entry price
-                        entry_price = row['Close'] * (1 + self.spread + self.slippage)
-                        investment_amount = self.capital * self.investment_fraction
-                        shares = investment_amount / entry_price
-                        position = {
-                            'trade_id': self.trade_id,
-                            'entry_price': entry_price,
-                            'entry_time': row.name,
-                            'shares': shares
-                        }
-                        logger.info("Entry executed. Adjusted entry price (spread + slippage): %s", entry_price)
-                        continue
-
-                # Check for exit signal
-                if position:
-                    exit_signal = self.strategy.exit_signal(row, self.data)
-                    if exit_signal:
-                        logger.info("Exit signal detected at %s. Base price: %s", row.name, row['Close'])
-                        # Apply spread and slippage to exit price
-                        exit_price = row['Close'] * (1 - self.spread - self.slippage)
-                        position['exit_price'] = exit_price
-                        position['exit_time'] = row.name
-                        profit = (position['exit_price'] - position['entry_price']) * position['shares']
-                        trade_fee = (position['entry_price'] + position['exit_price']) * position['shares'] * self.trade_fee
-                        profit -= trade_fee
-                        position['profit'] = profit
-                        self.capital += profit
-                        self.final_capital = self.capital
-                        self.trades.append(position)
-                        logger.info("Trade closed. Adjusted exit price (spread + slippage): %s, Profit: %s", 
-                                    exit_price, profit)
-                        position = None
-                        self.strategy.position_open = False
-                        continue
-
-            except Exception as e:
-                logger.error(f"Error processing row at {row.name}: {e}")
-                raise
-
-        # Close any open position at the end
-        if position:
-            logger.info("Closing remaining position at %s with base price %s", 
-                        self.data.index[-1], self.data['Close'].iloc[-1])
-            exit_price = self.data['Close'].iloc[-1] * (1 - self.spread - self.slippage)
-            position['exit_price'] = exit_price
-            position['exit_time'] = self.data.index[-1]
-            profit = (position['exit_price'] - position['entry_price']) * position['shares']
-            trade_fee = (position['entry_price'] + position['exit_price']) * position['shares'] * self.trade_fee
-            profit -= trade_fee
-            position['profit'] = profit
-            self.capital += profit
-            self.final_capital = self.capital
-            self.trades.append(position)
-            logger.info("Final trade closed. Adjusted exit price (spread + slippage): %s, Profit: %s", 
-                        exit_price, profit)
+        signals = self.strategy.compute_signals(self.data)
+        entry_idx, exit_idx, entry_price, exit_price, shares, profit, fees = simulate(
+            signals['entry'].to_numpy(),
+            signals['range_entry'].to_numpy(),
+            signals['exit'].to_numpy(),
+            signals['range_exit'].to_numpy(),
+            self.data['Close'].to_numpy(dtype=np.float64),
+            signals['stop_distance'].to_numpy(dtype=np.float64),
+            signals['take_profit_distance'].to_numpy(dtype=np.float64),
+            self.data.index.as_unit('ns').asi8,
+            float(self.capital),
+            float(self.trade_fee),
+            float(self.spread),
+            float(self.slippage),
+            float(self.investment_fraction),
+            float(self.strategy.config['trailing_stop_percentage']),
+            float(self.strategy.config['time_based_stop_days'] * 24 * 60 * 60 * 1000),
+            float(self.strategy.config['time_based_stop_loss_percent'])
+        )
+
+        times = self.data.index.as_unit('ns').to_numpy()
+        trade_ids = np.arange(self.trade_id + 1, self.trade_id + 1 + len(profit), dtype=np.int64)
+        self.trade_id += len(profit)
+        self._trade_ids = np.concatenate((self._trade_ids, trade_ids))
+        self._entry_idx = np.concatenate((self._entry_idx, entry_idx))
+        self._exit_idx = np.concatenate((self._exit_idx, exit_idx))
+        self._entry_price = np.concatenate((self._entry_price, entry_price))
+        self._exit_price = np.concatenate((self._exit_price, exit_price))
+        self._shares = np.concatenate((self._shares, shares))
+        self._profit = np.concatenate((self._profit, profit))
+        self._fees = np.concatenate((self._fees, fees))
+        self._entry_time = np.concatenate((self._entry_time, times[entry_idx]))
+        self._exit_time = np.concatenate((self._exit_time, times[exit_idx]))
+
+        info_on = logger.isEnabledFor(logging.INFO)
+        for k in range(len(profit)):
+            self.capital += float(profit[k])
+            if info_on:
+                logger.info("Trade %s closed. Entry: %s @ %s, Exit: %s @ %s (spread + slippage), Profit: %s",
+                            trade_ids[k], times[entry_idx[k]], entry_price[k], times[exit_idx[k]], exit_price[k], profit[k])
+        self.final_capital = self.capital
 
         logger.info("Backtest completed. Final capital: %s", self.final_capital)
 
@@ -140,27 +145,24 @@ class Backtester:
         try:
             total_profit = self.final_capital - self.initial_capital
             pl_percentage = (total_profit / self.initial_capital) * 100
-            num_trades = len(self.trades)
-            win_rate = sum(1 for trade in self.trades if trade['profit'] > 0) / num_trades if num_trades > 0 else 0
+            num_trades = len(self._profit)
+            # Win/loss masks are built once and shared by every per-trade metric below
+            win_mask = self._profit > 0
+            loss_mask = self._profit < 0
+            win_rate = float(win_mask.mean()) if num_trades > 0 else 0
 
-            # Calculate total fees (each trade has an entry and exit, so 2 fees per trade)
-            total_fees = 0
-            for trade in self.trades:
-                entry_fee = trade['entry_price'] * trade['shares'] * self.trade_fee
-                exit_fee = trade['exit_price'] * trade['shares'] * self.trade_fee
-                total_fees += (entry_fee + exit_fee)
+            # Total fees (entry + exit fee per trade, recorded by the simulation)
+            total_fees = float(self._fees.sum())
 
             # Calculate equity curve and max drawdown
-            equity_curve = [self.initial_capital]
-            for trade in self.trades:
-                equity_curve.append(equity_curve[-1] + trade['profit'])
-            equity_array = np.array(equity_curve)
-            max_drawdown = min(0, min(equity_array - np.maximum.accumulate(equity_array)))
+            equity_curve = self.initial_capital + np.concatenate(([0.0], np.cumsum(self._profit)))
+            drawdown = equity_curve - np.maximum.accumulate(equity_curve)
+            max_drawdown = float(drawdown.min()) if drawdown.size else 0.0
 
             # Buy and hold performance
-            if self.trades:
-                first_trade_open_price = self.trades[0]['entry_price']
-                last_trade_close_price = self.trades[-1]['exit_price']
+            if num_trades:
+                first_trade_open_price = float(self._entry_price[0])
+                last_trade_close_price = float(self._exit_price[-1])
                 logger.info("Buy and Hold (Trade Range): First trade open price: %s, Last trade close price: %s", 
                             first_trade_open_price, last_trade_close_price)
                 shares = self.initial_capital / first_trade_open_price
@@ -179,21 +181,23 @@ class Backtester:
             sharpe_ratio = np.mean(returns) / np.std(returns) * np.sqrt(252) if np.std(returns) != 0 else 0
 
             # 2. Sortino Ratio (downside risk only)
-            downside_returns = [min(r, 0) for r in returns]
+            downside_returns = np.minimum(returns, 0)
             sortino_ratio = np.mean(returns) / np.std(downside_returns) * np.sqrt(252) if np.std(downside_returns) != 0 else 0
 
             # 3. Average Trade Duration
-            trade_durations = [(trade['exit_time'] - trade['entry_time']).total_seconds() / 3600 for trade in self.trades]
-            avg_trade_duration_hours = sum(trade_durations) / num_trades if num_trades > 0 else 0
+            trade_durations = (self._exit_time - self._entry_time) / np.timedelta64(1, 'h')
+            avg_trade_duration_hours = float(trade_durations.mean()) if num_trades > 0 else 0
 
             # 4. Profit Factor
-            gross_profit = sum(trade['profit'] for trade in self.trades if trade['profit'] > 0)
-            gross_loss = abs(sum(trade['profit'] for trade in self.trades if trade['profit'] < 0))
+            wins = self._profit[win_mask]
+            losses = self._profit[loss_mask]
+            gross_profit = float(wins.sum())
+            gross_loss = abs(float(losses.sum()))
             profit_factor = gross_profit / gross_loss if gross_loss != 0 else float('inf')
 
             # 5. Expectancy
-            avg_win = gross_profit / sum(1 for trade in self.trades if trade['profit'] > 0) if win_rate > 0 else 0
-            num_losses = sum(1 for trade in self.trades if trade['profit'] < 0)
+            avg_win = gross_profit / wins.size if win_rate > 0 else 0
+            num_losses = losses.size
             avg_loss = gross_loss / num_losses if num_losses > 0 else 0
             expectancy = (win_rate * avg_win) - ((1 - win_rate) * avg_loss)
 
@@ -236,68 +240,92 @@ class Backtester:
         :param format_for_display: If True, format values with $ and %.
         :return: DataFrame with trade details.
         """
-        if not self.trades:
+        if not len(self._profit):
             logger.warning("No trades were made during the backtest.")
             return pd.DataFrame()
 
-        trade_log = pd.DataFrame(self.trades)
-        if 'exit_time' not in trade_log.columns or 'entry_time' not in trade_log.columns:
-            logger.error("Missing 'entry_time' or 'exit_time' in trade log.")
-            raise ValueError("Missing 'entry_time' or 'exit_time' in trade log.")
+        trade_log = pd.DataFrame({
+            'trade_id': self._trade_ids,
+            'entry_price': self._entry_price,
+            'entry_time': self._entry_time,
+            'shares': self._shares,
+            'exit_price': self._exit_price,
+            'exit_time': self._exit_time,
+            'profit': self._profit
+        })
 
-        trade_log['duration_ms'] = trade_log['exit_time'] - trade_log['entry_time']
-        trade_log['profit_percent'] = (trade_log['profit'] / (trade_log['entry_price'] * trade_log['shares'])) * 100
-        # Removed redundant insertion of trade_id since it's already added in run()
+        trade_log['duration_ms'] = self._exit_time - self._entry_time
+        trade_log['profit_percent'] = (self._profit / (self._entry_price * self._shares)) * 100
 
         if format_for_display:
-            display_log = trade_log.copy()
-            display_log['entry_price'] = display_log['entry_price'].map(lambda x: f"${x:,.2f}")
-            display_log['exit_price'] = display_log['exit_price'].map(lambda x: f"${x:,.2f}")
-            display_log['profit'] = display_log['profit'].map(lambda x: f"${x:,.2f}")
-            display_log['profit_percent'] = display_log['profit_percent'].map(lambda x: f"{x:.2f}%")
-            logger.info("\nTrade Log:\n%s", display_log.to_string(index=False))
+            # Formatting is applied while rendering, so no string copy of the log is built
+            format_money = "${:,.2f}".format
+            formatters = {
+                'entry_price': format_money,
+                'exit_price': format_money,
+                'profit': format_money,
+                'profit_percent': "{:.2f}%".format
+            }
+            logger.info("\nTrade Log:\n%s", trade_log.to_string(index=False, formatters=formatters))
 
         return trade_log
 
     @log_debug
-    def plot_results(self, output_folder, output_file="equity_with_price_plot.png"):
+    def plot_results(self, output_folder, output_file="equity_with_price_plot.png", dpi=150):
         """
         Plot equity curve with BTCUSD prices, trade signals, and SMA in one figure.
         Now using daily resampled equity data (more accurate).
+        Skipped for optimization runs, which never look at the figure.
+        :param output_folder: Folder to save the figure in.
+        :param output_file: Figure file name.
+        :param dpi: Resolution of the saved figure (use 300 for print quality).
         """
+        if self.from_optimize:
+            logger.debug("Skipping plot for optimization backtest.")
+            return
         import matplotlib.pyplot as plt
         from matplotlib.dates import YearLocator, DateFormatter
 
-        data_to_plot = self.data.copy()
         required_columns = ['Close']
-        if data_to_plot.empty or not all(col in data_to_plot.columns for col in required_columns):
+        if self.data.empty or not all(col in self.data.columns for col in required_columns):
             logger.warning("No data available to plot. Skipping plot.")
             return
-        if data_to_plot[required_columns].isna().all().any():
+        # Only the plotted columns are copied, not the full indicator frame.
+        # float32 is ample for screen coordinates and halves the copy.
+        data_to_plot = self.data[required_columns].astype(np.float32)
+        if np.isnan(data_to_plot.to_numpy()).all(axis=0).any():
             logger.warning("Required columns contain only NaN values. Skipping plot.")
             return
 
-        # Calculate SMA
-        sma_period = self.config["strategy"]["sma_long"]
-        data_to_plot['SMA'] = data_to_plot['Close'].rolling(window=sma_period).mean()
+        # Reuse the long SMA already calculated by the strategy
+        sma_period = self.strategy.config["sma_long"]
+        if 'sma_long' in self.data.columns:
+            data_to_plot['SMA'] = self.data['sma_long'].astype(np.float32)
+        else:
+            closes = data_to_plot['Close'].to_numpy()
+            sma = np.full(len(closes), np.nan, dtype=np.float32)
+            if len(closes) >= sma_period:
+                sma[sma_period - 1:] = sliding_window_view(closes, sma_period).mean(axis=1)
+            data_to_plot['SMA'] = sma
 
         # Generate equity points (based on exit_time)
-        equity_curve = [self.initial_capital]
-        equity_times = [self.data.index[0]]
-        for trade in self.trades:
-            equity_curve.append(equity_curve[-1] + trade['profit'])
-            equity_times.append(trade['exit_time'])
-        equity_df = pd.DataFrame({'Equity': equity_curve}, index=pd.to_datetime(equity_times))
+        equity_curve = self.initial_capital + np.concatenate(([0.0], np.cumsum(self._profit)))
+        equity_times = np.concatenate(([self.data.index[0].to_datetime64()], self._exit_time)).astype('datetime64[ns]')
+        equity_df = pd.DataFrame({'Equity': equity_curve}, index=pd.DatetimeIndex(equity_times))
         equity_df = equity_df.sort_index()
 
         # Resample equity to daily frequency
         daily_equity = equity_df.resample("D").ffill()
 
-        # Trade markers for price
-        entry_times = [pd.to_datetime(t['entry_time']) for t in self.trades]
-        exit_times = [pd.to_datetime(t['exit_time']) for t in self.trades]
-        entry_prices = [self.data.loc[et]['Close'] for et in entry_times if et in self.data.index]
-        exit_prices = [self.data.loc[et]['Close'] for et in exit_times if et in self.data.index]
+        # Price lines are drawn at daily resolution, like the equity curve
+        daily_prices = data_to_plot.resample("D").last().dropna(how='all')
+
+        # Trade markers for price, taken by position (no index lookups)
+        closes = data_to_plot['Close'].to_numpy()
+        entry_times = self._entry_time
+        exit_times = self._exit_time
+        entry_prices = closes[self._entry_idx]
+        exit_prices = closes[self._exit_idx]
 
         os.makedirs(output_folder, exist_ok=True)
         combined_file = os.path.join(output_folder, output_file)
@@ -316,8 +344,8 @@ class Backtester:
 
         # BTCUSD Price and SMA
         ax2 = ax.twinx()
-        ax2.plot(data_to_plot.index, data_to_plot['Close'], label='BTCUSD Price', color='#7f7f7f', linewidth=1.5, alpha=0.9)
-        ax2.plot(data_to_plot.index, data_to_plot['SMA'], label=f'SMA ({sma_period})', color='#FFA500', linewidth=2, linestyle='--', alpha=0.9)
+        ax2.plot(daily_prices.index, daily_prices['Close'], label='BTCUSD Price', color='#7f7f7f', linewidth=1.5, alpha=0.9)
+        ax2.plot(daily_prices.index, daily_prices['SMA'], label=f'SMA ({sma_period})', color='#FFA500', linewidth=2, linestyle='--', alpha=0.9)
         ax2.scatter(entry_times, entry_prices, marker='^', color='#2ECC71', label='Buy (Price)', s=100, edgecolor='black', alpha=1.0)
         ax2.scatter(exit_times, exit_prices, marker='v', color='#E74C3C', label='Sell (Price)', s=100, edgecolor='black', alpha=1.0)
         ax2.set_ylabel("BTCUSD Price ($)", color='#7f7f7f', fontsize=14)
@@ -334,6 +362,54 @@ class Backtester:
 
         plt.tight_layout()
         plt.subplots_adjust(bottom=0.2)
-        plt.savefig(combined_file, dpi=300)
+        plt.savefig(combined_file, dpi=dpi)
         plt.close()
         logger.info(f"Daily equity with price and signals saved at: {combined_file}")
+
+# Indicator frames from recent run_backtest calls, keyed on the data (range, dtypes and a
+# hash of the closes) and the strategy's indicator parameters (per process, least recently
+# used evicted first)
+_indicator_cache = OrderedDict()
+INDICATOR_CACHE_SIZE = 4
+
+def run_backtest(data, strategy_config, initial_capital, trade_fee, investment_fraction, spread, slippage):
+    """
+    Run a complete backtest for one strategy configuration and return its metrics.
+    Module-level so parameter sweeps can dispatch it to worker processes.
+    Indicators are reused from earlier calls in the same process when the data and the
+    indicator parameters match, so trials that only change exit/threshold parameters skip
+    the indicator pass.
+    :param data: OHLCV DataFrame; it is not modified (indicators are calculated on a copy).
+    :param strategy_config: Strategy parameters.
+    :return: Dictionary with metrics (see Backtester.calculate_metrics).
+    """
+    strategy = Strategy(strategy_config)
+    data_key = (len(data), data.index[0], data.index[-1], tuple(data.dtypes.astype(str)),
+                hash(data['Close'].to_numpy().tobytes()))
+    cache_key = data_key + strategy.indicator_signature()
+    if cache_key in _indicator_cache:
+        _indicator_cache.move_to_end(cache_key)
+        data = _indicator_cache[cache_key]
+    else:
+        data = data.copy()
+        strategy.calculate_indicators(data)
+        if data.isnull().any().any():
+            logger.warning("Data contains NaN values after calculating indicators.")
+        _indicator_cache[cache_key] = data
+        if len(_indicator_cache) > INDICATOR_CACHE_SIZE:
+            _indicator_cache.popitem(last=False)
+
+    backtester = Backtester(
+        data=data,
+        strategy=strategy,
+        initial_capital=initial_capital,
+        trade_fee=trade_fee,
+        investment_fraction=investment_fraction,
+        from_optimize=True
+    )
+    backtester.spread = spread
+    backtester.slippage = slippage
+    backtester.run()
+    if not len(backtester._profit):
+        logger.warning("No trades were executed during the backtest.")
+    return backtester.calculate_metrics()
@@ -1,34 +1,44 @@
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import os
-from logger import logger
-from functools import wraps
-
-def log_debug(func):
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        logger.debug(f"Entering {func.__name__}")
-        try:
-            result = func(*args, **kwargs)
-            logger.debug(f"Exiting {func.__name__}")
-            return result
-        except Exception as e:
-            logger.exception(f"Exception in {func.__name__}")
-            raise
-    return wrapper
+from logger import logger, log_debug
 
 class DataHandler:
-    def __init__(self, file_path, start_date=None, end_date=None, interval=None):
+    def __init__(self, file_path, start_date=None, end_date=None, interval=None, float32=False):
         """
         Initialize the DataHandler with optional date range and interval.
         :param file_path: Path to the data file.
         :param start_date: Start date for filtering (e.g., '2023-01-01').
         :param end_date: End date for filtering (e.g., '2023-12-31').
         :param interval: Resampling interval (e.g., '4H', '1D').
+        :param float32: Store OHLCV as float32 instead of float64 (halves memory, lower precision).
         """
         self.file_path = file_path
         self.start_date = start_date
         self.end_date = end_date
         self.interval = interval
+        self.float32 = float32
+
+    def _date_filters(self, schema):
+        """
+        Row filters that let the Parquet reader skip data outside the date range.
+        The bounds cover whole periods of the given dates, so they never cut rows the
+        .loc date filter keeps; that filter still applies the exact range.
+        :param schema: Arrow schema of the Parquet file.
+        :return: List of filters for read_parquet, or None to read every row.
+        """
+        if not (self.start_date and self.end_date) or 'Timestamp' not in schema.names:
+            return None
+        timestamp_type = schema.field('Timestamp').type
+        if not pa.types.is_timestamp(timestamp_type) or timestamp_type.tz is not None:
+            return None
+        try:
+            start = pd.Period(self.start_date).start_time
+            end = pd.Period(self.end_date).end_time
+        except ValueError:
+            return None
+        return [('Timestamp', '>=', start), ('Timestamp', '<=', end)]
 
     @log_debug
     def load_data(self):
@@ -39,9 +49,32 @@ class DataHandler:
             raise FileNotFoundError(f"The data file '{self.file_path}' does not exist.")
 
         if self.file_path.endswith('.csv'):
-            data = pd.read_csv(self.file_path, parse_dates=['Timestamp'])
+            # Parsed CSVs are cached next to the source as Parquet+zstd; the cache is reused
+            # until the CSV is modified again
+            cache_path = self.file_path + '.cache.parquet'
+            if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(self.file_path):
+                logger.debug("Loading cached data from %s", cache_path)
+                data = pd.read_parquet(cache_path)
+            else:
+                # The pyarrow engine parses columns in parallel in C++
+                data = pd.read_csv(self.file_path, engine='pyarrow', parse_dates=['Timestamp'])
+                # Written to a per-process temporary file and moved into place, so a concurrent
+                # reader (e.g. another optimizer worker) never sees a half-written cache
+                tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+                try:
+                    data.to_parquet(tmp_path, compression='zstd', engine='pyarrow')
+                    os.replace(tmp_path, cache_path)
+                except OSError as e:
+                    logger.warning("Could not write data cache %s: %s", cache_path, e)
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
         elif self.file_path.endswith('.parquet'):
-            data = pd.read_parquet(self.file_path)
+            # Only read the timestamp and OHLCV columns; extra columns (VWAP, Count) are skipped.
+            # Missing ones are left out here so the checks below can report them.
+            load_columns = ['Timestamp', 'Open', 'High', 'Low', 'Close', 'Volume']
+            schema = pq.read_schema(self.file_path)
+            data = pd.read_parquet(self.file_path, columns=[col for col in load_columns if col in schema.names],
+                                   filters=self._date_filters(schema))
             # Ensure Timestamp is parsed as datetime if it's a column or index
             if 'Timestamp' in data.columns:
                 data['Timestamp'] = pd.to_datetime(data['Timestamp'])
@@ -60,7 +93,9 @@ class DataHandler:
             data.set_index('Timestamp', inplace=True)
 
         # Log the date range after loading
-        logger.debug(f"Loaded data date range: {data.index[0]} to {data.index[-1]}")
+        # The date filter is pushed into the Parquet read, so the loaded data may already be empty
+        if not data.empty:
+            logger.debug(f"Loaded data date range: {data.index[0]} to {data.index[-1]}")
         logger.debug(f"Loaded data index type: {type(data.index)}")
 
         # Validate required columns
@@ -70,10 +105,18 @@ class DataHandler:
             raise ValueError(f"The data file '{self.file_path}' is missing required columns: {missing_columns}. "
                             f"Columns found: {list(data.columns)}")
 
-        # Filter by date range
+        # Keep OHLCV as one float block so downstream array access needs no conversion
+        dtype = 'float32' if self.float32 else 'float64'
+        data = data.astype({col: dtype for col in required_columns})
+
+        # Filter by date range. On a sorted index .loc slices by binary search, so only
+        # out-of-order files pay for a sort.
+        if not data.index.is_monotonic_increasing:
+            data = data.sort_index()
         if self.start_date and self.end_date:
             data = data.loc[self.start_date:self.end_date]
-            logger.debug(f"Filtered data date range: {data.index[0]} to {data.index[-1]}")
+            if not data.empty:
+                logger.debug(f"Filtered data date range: {data.index[0]} to {data.index[-1]}")
 
         # Ensure the filtered data is not empty
         if data.empty:
@@ -82,7 +125,9 @@ class DataHandler:
         # Resample data to the specified interval
         if self.interval:
             interval = self.interval.lower()
-            data = data.resample(interval).agg({
+            # Anchored on the epoch like live_paper's candles, so backtests see the same buckets
+            # as the live bot whatever the start date
+            data = data.resample(interval, origin='epoch').agg({
                 'Open': 'first',
                 'High': 'max',
                 'Low': 'min',
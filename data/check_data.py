@@ -1,4 +1,8 @@
 import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 import requests
 from datetime import datetime
 import os
@@ -17,7 +21,20 @@ def inspect_parquet(file_path):
     """Inspects the Parquet file and displays its metadata and data."""
     try:
         print("\n--- Inspecting Parquet File ---")
-        df = pd.read_parquet(file_path)
+        # Read once from memory-mapped pages; null and infinite counts are taken from the
+        # Arrow columns before converting to pandas for display
+        table = pq.read_table(file_path, memory_map=True)
+        null_counts = {}
+        inf_counts = {}
+        for field in table.schema:
+            column = table.column(field.name)
+            null_counts[field.name] = column.null_count
+            inf_counts[field.name] = 0
+            if pa.types.is_floating(field.type):
+                # NaN is not an Arrow null but pandas counts it as one
+                null_counts[field.name] += pc.sum(pc.is_nan(column)).as_py() or 0
+                inf_counts[field.name] = pc.sum(pc.is_inf(column)).as_py() or 0
+        df = table.to_pandas()
         print(f"File: {file_path}")
         print(f"Number of rows: {len(df)}")
         print(f"Columns: {df.columns.tolist()}")
@@ -29,11 +46,11 @@ def inspect_parquet(file_path):
         print("\nDescriptive statistics:")
         print(df.describe())
         print("\nNull values per column:")
-        print(df.isnull().sum())
+        print(pd.Series(null_counts))
         print("\nDuplicated values:")
         print(df.duplicated().sum())
         print("\nInfinite values per column:")
-        print(df.isin([float('inf'), float('-inf')]).sum())
+        print(pd.Series(inf_counts))
         print("\n--- End Parquet Inspection ---\n")
         return df
     except FileNotFoundError:
@@ -57,9 +74,12 @@ def get_kraken_data(pair, interval, since=None):
             print(f"Kraken API error: {data['error']}")
             return None
         ohlc_data = data["result"][pair]
-        df = pd.DataFrame(ohlc_data, columns=["time", "open", "high", "low", "close", "vwap", "volume", "count"])
-        df[["open", "high", "low", "close", "vwap", "volume"]] = df[["open", "high", "low", "close", "vwap", "volume"]].apply(pd.to_numeric)
-        df["time"] = pd.to_datetime(df["time"], unit="s")
+        # Rows are [time, open, high, low, close, vwap, volume, count] with prices as strings;
+        # convert each block with one typed cast instead of per-column to_numeric
+        raw = np.array(ohlc_data, dtype=object).reshape(-1, 8)
+        df = pd.DataFrame(raw[:, 1:7].astype(np.float64), columns=["open", "high", "low", "close", "vwap", "volume"])
+        df.insert(0, "time", pd.to_datetime(raw[:, 0].astype(np.int64), unit="s"))
+        df["count"] = raw[:, 7].astype(np.int64)
         print(f"Kraken API data (first 5 rows):\n{df.head()}")
         print(f"\nKraken API data (last 5 rows):\n{df.tail()}")
         print("\n--- End Kraken API Data ---\n")
@@ -2,61 +2,80 @@ import requests
 import time
 from datetime import datetime, timedelta
 import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 import os
 import logging
 import signal
 import sys
+import gzip
+import json
+import shutil
 
-# Configure logging to debug.log
-logging.basicConfig(
-    filename="debug.log",
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s"
-)
 logger = logging.getLogger(__name__)
 
 # Output file (absolute path from project root)
 output_file = os.path.join("data", "ohlc_data_60min_all_years.parquet")
-print(f"Absolute path of OHLC file: {os.path.abspath(output_file)}")
-logger.info(f"Absolute path of OHLC file: {os.path.abspath(output_file)}")
 pair = "XXBTZUSD"
 base_url = "https://api.kraken.com/0/public/Trades"
+# One keep-alive session, so consecutive pages reuse the TCP/TLS connection
+session = requests.Session()
+BAR_NS = 60 * 60 * 1_000_000_000  # 60min bars, in nanoseconds
+# Rows per Parquet row group (~64 KB per column): small enough for readers to skip most of
+# the history by its statistics, large enough to keep the footer short
+ROW_GROUP_SIZE = 8192
+# Complete trade pages are kept here until the bars built from them are saved, so a rerun
+# after a crash does not download them again
+cache_dir = os.path.join("data", ".cache", "trades")
 
-# Global variable to store new data
-new_ohlc_data = []
+class TokenBucket:
+    """Rate limiter that allows short bursts and sleeps only once they are used up."""
+    def __init__(self, rate_per_sec, capacity):
+        self.rate = rate_per_sec
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last = time.monotonic()
 
-# Get the last timestamp from the existing file
-if os.path.exists(output_file):
-    df_existing = pd.read_parquet(output_file)
-    print(f"Existing file, rows: {len(df_existing)}")
-    logger.info(f"Existing file, rows: {len(df_existing)}")
-    if not df_existing.empty:
-        # Ensure Timestamp is datetime
-        if not pd.api.types.is_datetime64_any_dtype(df_existing["Timestamp"]):
-            df_existing["Timestamp"] = pd.to_datetime(df_existing["Timestamp"])
-        last_timestamp = df_existing["Timestamp"].max()
-        print(f"Last timestamp found in file: {last_timestamp}")
-        logger.info(f"Last timestamp found in file: {last_timestamp}")
-        start_date = last_timestamp + pd.Timedelta(minutes=60)
-    else:
-        print("Empty file, starting from 2024-01-01")
-        logger.info("Empty file, starting from 2024-01-01")
-        start_date = datetime(2024, 1, 1)
-else:
-    print("File does not exist, starting from 2024-01-01")
-    logger.info("File does not exist, starting from 2024-01-01")
-    start_date = datetime(2024, 1, 1)
+    def acquire(self):
+        """Takes one token, sleeping until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        if self.tokens < 1:
+            time.sleep((1 - self.tokens) / self.rate)
+            # The refilled token is spent on this call
+            self.tokens = 0
+            self.last = time.monotonic()
+        else:
+            self.tokens -= 1
 
-end_date = datetime.utcnow()
+# Kraken public endpoints: a burst of a few calls, then about one call per second
+bucket = TokenBucket(rate_per_sec=1.0, capacity=5)
 
-print(f"Updating data from {start_date} to {end_date}...")
-logger.info(f"Updating data from {start_date} to {end_date}...")
+# New bars of the current run, one Arrow record batch per trade page
+new_ohlc_data = []
+
+def get_last_timestamp(file_path):
+    """Returns the row count and the latest Timestamp of a Parquet file, read from its footer."""
+    parquet_file = pq.ParquetFile(file_path)
+    num_rows = parquet_file.metadata.num_rows
+    if num_rows == 0:
+        return num_rows, None
+    column = parquet_file.schema_arrow.get_field_index("Timestamp")
+    row_groups = [parquet_file.metadata.row_group(i) for i in range(parquet_file.num_row_groups)]
+    statistics = [row_group.column(column).statistics for row_group in row_groups if row_group.num_rows > 0]
+    if all(stats is not None and stats.has_min_max for stats in statistics):
+        return num_rows, pd.Timestamp(max(stats.max for stats in statistics))
+    # Files written without statistics: read the Timestamp column only
+    return num_rows, pd.to_datetime(pd.read_parquet(file_path, columns=["Timestamp"])["Timestamp"]).max()
 
 def get_trades(pair, since=None):
     params = {"pair": pair}
     if since:
         params["since"] = since
-    response = requests.get(base_url, params=params)
+    response = session.get(base_url, params=params, timeout=30)
     data = response.json()
     if "error" in data and data["error"]:
         print(f"API error: {data['error']}")
@@ -64,57 +83,166 @@ def get_trades(pair, since=None):
         return None, None
     return data["result"][pair], data["result"]["last"]
 
+def load_cached_trades(since):
+    cache_path = os.path.join(cache_dir, f"{since}.json.gz")
+    if not os.path.exists(cache_path):
+        return None, None
+    with gzip.open(cache_path, "rt") as f:
+        page = json.load(f)
+    return page["trades"], page["last"]
+
+def save_cached_trades(since, trades, last):
+    # Pages whose last trade is over an hour old no longer change; newer ones may still grow
+    if not trades or float(trades[-1][2]) > time.time() - 3600:
+        return
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with gzip.open(os.path.join(cache_dir, f"{since}.json.gz"), "wt") as f:
+            json.dump({"trades": trades, "last": last}, f)
+    except OSError as e:
+        logger.warning(f"Could not cache trades page {since}: {e}")
+
 def trades_to_ohlc(trades):
-    df_trades = pd.DataFrame(trades, columns=["price", "volume", "time", "buy_sell", "market_limit", "misc", "trade_id"])
-    df_trades["time"] = pd.to_datetime(df_trades["time"].astype(float), unit="s")
-    df_trades["price"] = df_trades["price"].astype(float)
-    df_trades["volume"] = df_trades["volume"].astype(float)
-    if df_trades.empty:
+    # Trades are [price, volume, time, buy_sell, market_limit, misc, trade_id] with price and
+    # volume as strings; only the first three fields are used, each converted with one typed cast
+    if len(trades) == 0:
         return pd.DataFrame(columns=["Timestamp", "Open", "High", "Low", "Close", "VWAP", "Volume", "Count"])
-    df_ohlc = df_trades.resample("60min", on="time").agg({
-        "price": ["first", "max", "min", "last"],
-        "volume": "sum"
-    }).dropna()
-    df_ohlc.columns = ["Open", "High", "Low", "Close", "Volume"]
-    df_ohlc["Timestamp"] = df_ohlc.index
-    vwap = (df_trades["price"] * df_trades["volume"]).sum() / df_trades["volume"].sum() if df_trades["volume"].sum() > 0 else 0
-    df_ohlc["VWAP"] = vwap
-    df_ohlc["Count"] = df_trades.resample("60min", on="time").size()
-    return df_ohlc[["Timestamp", "Open", "High", "Low", "Close", "VWAP", "Volume", "Count"]]
+    raw = np.array(trades, dtype=object).reshape(len(trades), -1)
+    prices = raw[:, 0].astype(np.float64)
+    volumes = raw[:, 1].astype(np.float64)
+    times_ns = pd.to_datetime(raw[:, 2].astype(np.float64), unit="s").asi8
+    # Bars are reduced over runs of equal hour buckets of time-ordered trades instead of
+    # going through resample; Kraken returns trades in time order, so the sort rarely runs
+    if np.any(times_ns[1:] < times_ns[:-1]):
+        order = np.argsort(times_ns, kind="stable")
+        times_ns, prices, volumes = times_ns[order], prices[order], volumes[order]
+    buckets = times_ns // BAR_NS
+    starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+    ends = np.append(starts[1:], len(buckets))
+    bar_volume = np.add.reduceat(volumes, starts)
+    # VWAP per bar from the price * volume products, computed once for the whole batch
+    bar_price_volume = np.add.reduceat(prices * volumes, starts)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        vwap = np.where(bar_volume > 0, bar_price_volume / bar_volume, 0.0)
+    return pd.DataFrame({
+        "Timestamp": pd.to_datetime(buckets[starts] * BAR_NS),
+        "Open": prices[starts],
+        "High": np.maximum.reduceat(prices, starts),
+        "Low": np.minimum.reduceat(prices, starts),
+        "Close": prices[ends - 1],
+        "VWAP": vwap,
+        "Volume": bar_volume,
+        "Count": ends - starts
+    })
+
+def read_tail(file_path, rows=5):
+    """Returns the last rows of a Parquet file, reading only the row groups that hold them."""
+    parquet_file = pq.ParquetFile(file_path)
+    tables = []
+    remaining = rows
+    for i in reversed(range(parquet_file.num_row_groups)):
+        if remaining <= 0:
+            break
+        tables.insert(0, parquet_file.read_row_group(i))
+        remaining -= tables[0].num_rows
+    if not tables:
+        return parquet_file.schema_arrow.empty_table().to_pandas()
+    return pa.concat_tables(tables).to_pandas().tail(rows).reset_index(drop=True)
+
+def merge_bars(table):
+    """Combines bars of the same hour into one and sorts them by Timestamp."""
+    # An hour that straddles two trade pages arrives as two partial bars; they are merged in
+    # page order, which is time order
+    table = table.append_column("PV", pc.multiply(table["VWAP"], table["Volume"]))
+    merged = table.group_by("Timestamp", use_threads=False).aggregate([
+        ("Open", "first"), ("High", "max"), ("Low", "min"), ("Close", "last"),
+        ("Volume", "sum"), ("PV", "sum"), ("Count", "sum")
+    ]).sort_by("Timestamp")
+    volume = merged["Volume_sum"]
+    vwap = pc.if_else(pc.greater(volume, 0), pc.divide(merged["PV_sum"], volume), 0.0)
+    return pa.table({
+        "Timestamp": merged["Timestamp"],
+        "Open": merged["Open_first"],
+        "High": merged["High_max"],
+        "Low": merged["Low_min"],
+        "Close": merged["Close_last"],
+        "VWAP": vwap,
+        "Volume": volume,
+        "Count": merged["Count_sum"]
+    })
+
+def write_options(schema):
+    """Parquet writer options for the bar file: zstd, statistics and page indexes, sorted by Timestamp."""
+    # The bars are written in Timestamp order; recording it in the footer, with per-page
+    # min/max indexes, lets filtered readers skip row groups and pages without scanning them
+    return dict(
+        compression="zstd",
+        write_statistics=True,
+        write_page_index=True,
+        sorting_columns=[pq.SortingColumn(schema.get_field_index("Timestamp"))]
+    )
 
 def combine_and_save(new_ohlc, output_file):
-    if new_ohlc is None or len(new_ohlc) == 0:
+    if new_ohlc is None or new_ohlc.num_rows == 0:
         print("No new data to save.")
         logger.info("No new data to save.")
         return
+    new_table = merge_bars(new_ohlc)
     if os.path.exists(output_file):
-        df_existing = pd.read_parquet(output_file)
-        df_combined = pd.concat([df_existing, new_ohlc]).drop_duplicates(subset="Timestamp").sort_values("Timestamp")
+        # The file is kept sorted and unique, so only bars after its last one are appended;
+        # the history itself is not deduplicated or sorted again
+        existing_rows, last_timestamp = get_last_timestamp(output_file)
+        if last_timestamp is not None:
+            cutoff = pa.scalar(last_timestamp, new_table.schema.field("Timestamp").type)
+            new_table = new_table.filter(pc.greater(new_table["Timestamp"], cutoff))
+        if new_table.num_rows == 0:
+            print("No new data to save.")
+            logger.info("No new data to save.")
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            return
+        # Stream the existing row groups into a new file followed by the new bars, so the
+        # history is never loaded into pandas or held in memory at once. The file is swapped
+        # in only once it is complete.
+        existing = pq.ParquetFile(output_file)
+        new_rows = new_table.num_rows
+        new_table = new_table.select(existing.schema_arrow.names).cast(existing.schema_arrow)
+        temp_file = output_file + ".tmp"
+        with pq.ParquetWriter(temp_file, existing.schema_arrow, **write_options(existing.schema_arrow)) as writer:
+            for i in range(existing.num_row_groups - 1):
+                writer.write_table(existing.read_row_group(i), row_group_size=ROW_GROUP_SIZE)
+            # The new bars are merged into the last, partly filled row group instead of adding
+            # a small row group per update
+            if existing.num_row_groups > 0:
+                new_table = pa.concat_tables([existing.read_row_group(existing.num_row_groups - 1), new_table])
+            writer.write_table(new_table, row_group_size=ROW_GROUP_SIZE)
+        existing.close()
+        os.replace(temp_file, output_file)
+        total_rows = existing_rows + new_rows
     else:
-        df_combined = new_ohlc.drop_duplicates(subset="Timestamp").sort_values("Timestamp")
-    df_combined.to_parquet(output_file, index=False)
-    print(f"Data saved to '{output_file}'. Total points: {len(df_combined)}")
-    logger.info(f"Data saved to '{output_file}'. Total points: {len(df_combined)}")
+        pq.write_table(new_table, output_file, row_group_size=ROW_GROUP_SIZE, **write_options(new_table.schema))
+        total_rows = new_table.num_rows
+    print(f"Data saved to '{output_file}'. Total points: {total_rows}")
+    logger.info(f"Data saved to '{output_file}'. Total points: {total_rows}")
+    # The cached pages are now part of the file
+    shutil.rmtree(cache_dir, ignore_errors=True)
 
 # Ctrl+C handler
 def signal_handler(sig, frame):
     print("\nCtrl+C detected. Saving new data before exiting...")
     logger.info("Ctrl+C detected. Saving new data before exiting...")
     if new_ohlc_data:
-        df_new = pd.concat(new_ohlc_data)
-        combine_and_save(df_new, output_file)
+        combine_and_save(pa.Table.from_batches(new_ohlc_data), output_file)
     else:
         print("No new data to save.")
         logger.info("No new data to save.")
     sys.exit(0)
 
-signal.signal(signal.SIGINT, signal_handler)
-
 def download_new_data(start_date, end_date):
+    # Bars left over from an earlier call that failed are downloaded again
+    new_ohlc_data.clear()
     start_timestamp = int(start_date.timestamp())
     end_timestamp = int(end_date.timestamp())
     current_since = start_timestamp
-    all_ohlc_data = []
     max_timestamp_seen = start_timestamp
     print(f"Downloading new trades from {start_date} to {end_date}...")
     logger.info(f"Downloading new trades from {start_date} to {end_date}...")
@@ -123,15 +251,19 @@ def download_new_data(start_date, end_date):
     while True:
         print(f"Requesting trades from timestamp: {current_since}")
         logger.info(f"Requesting trades from timestamp: {current_since}")
-        trades, last = get_trades(pair, current_since)
+        trades, last = load_cached_trades(current_since)
+        from_cache = trades is not None
+        if not from_cache:
+            bucket.acquire()
+            trades, last = get_trades(pair, current_since)
+            save_cached_trades(current_since, trades, last)
         if not trades:
             print("No trades received, stopping loop.")
             logger.info("No trades received, stopping loop.")
             break
         df_ohlc = trades_to_ohlc(trades)
         if not df_ohlc.empty:
-            all_ohlc_data.append(df_ohlc)
-            new_ohlc_data.append(df_ohlc)
+            new_ohlc_data.append(pa.RecordBatch.from_pandas(df_ohlc, preserve_index=False))
             max_ts = int(df_ohlc["Timestamp"].iloc[-1].timestamp())
             max_timestamp_seen = max(max_timestamp_seen, max_ts)
             print(f"OHLC points generated: {len(df_ohlc)}, First timestamp: {df_ohlc['Timestamp'].iloc[0]}, Last timestamp: {df_ohlc['Timestamp'].iloc[-1]}")
@@ -157,24 +289,70 @@ def download_new_data(start_date, end_date):
             print(f"End of range reached: {end_date}")
             logger.info(f"End of range reached: {end_date}")
             break
-        time.sleep(1)
-    if all_ohlc_data:
-        df_new = pd.concat(all_ohlc_data)
-        df_new = df_new[(df_new["Timestamp"] >= pd.to_datetime(start_timestamp, unit="s")) & \
-                        (df_new["Timestamp"] <= pd.to_datetime(end_timestamp, unit="s"))]
-        combine_and_save(df_new, output_file)
+    if new_ohlc_data:
+        # The batches are only concatenated once, without copying, into one table
+        new_table = pa.Table.from_batches(new_ohlc_data)
+        timestamp_type = new_table.schema.field("Timestamp").type
+        in_range = pc.and_(
+            pc.greater_equal(new_table["Timestamp"], pa.scalar(pd.to_datetime(start_timestamp, unit="s"), timestamp_type)),
+            pc.less_equal(new_table["Timestamp"], pa.scalar(pd.to_datetime(end_timestamp, unit="s"), timestamp_type))
+        )
+        combine_and_save(new_table.filter(in_range), output_file)
         new_ohlc_data.clear()
     else:
         print("No new data to add.")
         logger.info("No new data to add.")
 
-download_new_data(start_date, end_date)
+def update():
+    """Downloads the bars after the last one in the file, up to now, and appends them to it."""
+    # Get the last timestamp from the existing file
+    if os.path.exists(output_file):
+        existing_rows, last_timestamp = get_last_timestamp(output_file)
+        print(f"Existing file, rows: {existing_rows}")
+        logger.info(f"Existing file, rows: {existing_rows}")
+        if last_timestamp is not None:
+            print(f"Last timestamp found in file: {last_timestamp}")
+            logger.info(f"Last timestamp found in file: {last_timestamp}")
+            start_date = last_timestamp + pd.Timedelta(minutes=60)
+        else:
+            print("Empty file, starting from 2024-01-01")
+            logger.info("Empty file, starting from 2024-01-01")
+            start_date = datetime(2024, 1, 1)
+    else:
+        print("File does not exist, starting from 2024-01-01")
+        logger.info("File does not exist, starting from 2024-01-01")
+        start_date = datetime(2024, 1, 1)
+
+    end_date = datetime.utcnow()
+
+    print(f"Updating data from {start_date} to {end_date}...")
+    logger.info(f"Updating data from {start_date} to {end_date}...")
+
+    download_new_data(start_date, end_date)
+
+def main():
+    # Configure logging to debug.log
+    logging.basicConfig(
+        filename="debug.log",
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    print(f"Absolute path of OHLC file: {os.path.abspath(output_file)}")
+    logger.info(f"Absolute path of OHLC file: {os.path.abspath(output_file)}")
+    signal.signal(signal.SIGINT, signal_handler)
+
+    update()
+
+    # Show final information
+    if os.path.exists(output_file):
+        # Row count from the footer and the last rows from the final row group(s) only
+        total_rows = pq.ParquetFile(output_file).metadata.num_rows
+        df_tail = read_tail(output_file)
+        print(f"Total data points collected: {total_rows}")
+        logger.info(f"Total data points collected: {total_rows}")
+        print("Last 5 rows:")
+        logger.info(f"Last 5 rows:\n{df_tail.to_string(index=False)}")
+        print(df_tail)
 
-# Show final information
-if os.path.exists(output_file):
-    df_final = pd.read_parquet(output_file)
-    print(f"Total data points collected: {len(df_final)}")
-    logger.info(f"Total data points collected: {len(df_final)}")
-    print("Last 5 rows:")
-    logger.info(f"Last 5 rows:\n{df_final.tail().to_string(index=False)}")
-    print(df_final.tail())
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+# engine.py
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    # Without Numba the simulation kernel runs as plain Python over the same arrays
+    def njit(*args, **kwargs):
+        def decorator(func):
+            return func
+        return decorator
+
+@njit(cache=True, nogil=True)
+def simulate(entries, range_entries, exits, range_exits, closes, stop_distances, take_profit_distances,
+             times_i8, initial_capital, trade_fee, spread, slippage, investment_fraction,
+             trailing_stop_percentage, time_based_stop_ms, time_based_stop_loss_percent):
+    """
+    Compiled trade simulation over precomputed signal arrays.
+    Capital compounds from trade to trade, so the walk is sequential; see Backtester.run for the rules.
+    :return: Tuple of trade arrays (entry_idx, exit_idx, entry_price, exit_price, shares, profit, fees),
+             trimmed to the number of trades.
+    """
+    n = closes.shape[0]
+    # Every trade opens on an entry candle and lasts at least one candle
+    max_trades = min(np.count_nonzero(entries), n // 2 + 1)
+    entry_idx = np.empty(max_trades, dtype=np.int64)
+    exit_idx = np.empty(max_trades, dtype=np.int64)
+    entry_price = np.empty(max_trades, dtype=np.float64)
+    exit_price = np.empty(max_trades, dtype=np.float64)
+    shares = np.empty(max_trades, dtype=np.float64)
+    profit = np.empty(max_trades, dtype=np.float64)
+    fees = np.empty(max_trades, dtype=np.float64)
+
+    # Loop invariants
+    entry_factor = 1 + spread + slippage
+    exit_factor = 1 - spread - slippage
+    one_plus_fee = 1.0 + trade_fee
+    one_minus_fee = 1.0 - trade_fee
+
+    capital = initial_capital
+    in_position = False
+    is_range_trading = False
+    base_price = 0.0
+    highest_price = 0.0
+    ep = 0.0
+    sh = 0.0
+    t = 0
+    for i in range(n):
+        close = closes[i]
+        if not in_position:
+            if entries[i]:
+                # Apply spread and slippage to entry price
+                ep = close * entry_factor
+                sh = capital * investment_fraction / ep
+                base_price = close
+                highest_price = close
+                is_range_trading = range_entries[i]
+                entry_idx[t] = i
+                in_position = True
+            continue
+
+        highest_price = max(highest_price, close)
+        if is_range_trading:
+            exit_signal = range_exits[i]
+        else:
+            duration_ms = (times_i8[i] - times_i8[entry_idx[t]]) / 1e9 * 1000
+            profit_percent = (close - base_price) / base_price * 100
+            exit_signal = (
+                exits[i] or
+                close < highest_price * (1 - trailing_stop_percentage) or
+                close < base_price - stop_distances[i] or
+                close > base_price + take_profit_distances[i] or
+                (duration_ms < time_based_stop_ms and profit_percent < time_based_stop_loss_percent)
+            )
+        if exit_signal:
+            # Apply spread and slippage to exit price
+            xp = close * exit_factor
+            # (xp - ep) * sh minus fees on both legs, fused
+            pnl = sh * (xp * one_minus_fee - ep * one_plus_fee)
+            capital += pnl
+            exit_idx[t] = i
+            entry_price[t] = ep
+            exit_price[t] = xp
+            shares[t] = sh
+            profit[t] = pnl
+            fees[t] = sh * (ep + xp) * trade_fee
+            t += 1
+            in_position = False
+
+    # Close any open position at the end
+    if in_position:
+        xp = closes[n - 1] * exit_factor
+        pnl = sh * (xp * one_minus_fee - ep * one_plus_fee)
+        exit_idx[t] = n - 1
+        entry_price[t] = ep
+        exit_price[t] = xp
+        shares[t] = sh
+        profit[t] = pnl
+        fees[t] = sh * (ep + xp) * trade_fee
+        t += 1
+
+    return entry_idx[:t], exit_idx[:t], entry_price[:t], exit_price[:t], shares[:t], profit[:t], fees[:t]
+
+@njit(cache=True, nogil=True)
+def ewm_mean(values, span):
+    """
+    Exponential moving average, equivalent to Series.ewm(span=span, adjust=False).mean()
+    (same recurrence and NaN handling, so results match pandas exactly).
+    :param values: float64 array.
+    :param span: EMA span.
+    :return: float64 array of the same length.
+    """
+    alpha = 1.0 / (1.0 + (span - 1) / 2.0)
+    old_wt_factor = 1.0 - alpha
+    n = values.shape[0]
+    out = np.empty(n, dtype=np.float64)
+    if n == 0:
+        return out
+    weighted = values[0]
+    out[0] = weighted
+    old_wt = 1.0
+    for i in range(1, n):
+        cur = values[i]
+        is_observation = cur == cur
+        if weighted == weighted:
+            old_wt *= old_wt_factor
+            if is_observation:
+                if weighted != cur:
+                    weighted = (old_wt * weighted + alpha * cur) / (old_wt + alpha)
+                old_wt = 1.0
+        elif is_observation:
+            weighted = cur
+        out[i] = weighted
+    return out
+
+@njit(cache=True, nogil=True)
+def rolling_high_low(high, low, window):
+    """
+    Rolling maximum of high and rolling minimum of low in a single pass, equivalent to
+    high.rolling(window).max() and low.rolling(window).min() on NaN-free input.
+    :return: Tuple (highest, lowest) of float64 arrays, NaN for the first window - 1 rows.
+    """
+    n = high.shape[0]
+    highest = np.full(n, np.nan)
+    lowest = np.full(n, np.nan)
+    for i in range(window - 1, n):
+        h = high[i]
+        l = low[i]
+        for j in range(i - window + 1, i):
+            if high[j] > h:
+                h = high[j]
+            if low[j] < l:
+                l = low[j]
+        highest[i] = h
+        lowest[i] = l
+    return highest, lowest
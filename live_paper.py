@@ -1,15 +1,20 @@
-import signal, functools, os, time, sqlite3, json, subprocess, threading
+import signal, functools, os, time, sqlite3, json, threading, atexit, contextlib, importlib.util
 import krakenex, pandas as pd, requests
 from datetime import datetime
+from pandas.tseries.frequencies import to_offset
 from strategy import Strategy
 from logger import logger
 from colorama import init, Fore, Style
 from inputimeout import inputimeout, TimeoutOccurred
+from collections import deque
 import functools
 import sys
 import threading
 from inputimeout import inputimeout, TimeoutOccurred
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_PATH = os.path.join(BASE_DIR, "config.json")
+
 init(autoreset=True)
 
 # Retry decorator for robustness
@@ -80,7 +85,11 @@ CONFIG = load_config()
 STRATEGY_CONFIG = CONFIG["strategy"]
 GENERAL_CONFIG = CONFIG["general"]
 
+# krakenex keeps one requests.Session, so every call reuses the same keep-alive connection
 k = krakenex.API()
+# Seconds before a Kraken call gives up; without it a stalled connection blocks the loop and
+# the retry decorators never see a requests.Timeout
+API_TIMEOUT = 10
 
 # Parameters
 PAIR = "XXBTZUSD"  # BTC/USD
@@ -90,6 +99,41 @@ DB_FILE = "paper_trades.db"
 # Initialize threading lock for database operations
 DB_LOCK = threading.Lock()
 
+def _connect():
+    """
+    Open a connection to the trades database with WAL journaling and server-style pragmas.
+
+    Returns:
+        sqlite3.Connection: Connection in autocommit mode; use explicit transactions to group writes.
+    """
+    conn = sqlite3.connect(DB_FILE, isolation_level=None, check_same_thread=False)
+    # WAL lets readers run alongside the writer, and with synchronous=NORMAL a commit no
+    # longer waits for an fsync (still crash-safe in WAL mode)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-20000")
+    conn.execute("PRAGMA foreign_keys=ON")
+    return conn
+
+# Long-lived connection shared by every database call of the bot (guarded by DB_LOCK),
+# so the trading loop does not reopen the database and rewarm its page cache each cycle
+_WRITER = None
+
+def _get_writer():
+    """
+    Return the shared database connection, opening it on first use.
+
+    Returns:
+        sqlite3.Connection: Connection opened by _connect(), closed at interpreter exit.
+    """
+    global _WRITER
+    if _WRITER is None:
+        _WRITER = _connect()
+        atexit.register(_WRITER.close)
+    return _WRITER
+
 def setup_database():
     """
     Initialize SQLite database and ensure the trades and initial_balance tables exist.
@@ -97,7 +141,7 @@ def setup_database():
     Raises:
         sqlite3.OperationalError: On database operation failure.
     """
-    conn = sqlite3.connect(DB_FILE)
+    conn = _get_writer()
     c = conn.cursor()
     # Add 'source' column if it doesn't exist
     c.execute('''CREATE TABLE IF NOT EXISTS trades (
@@ -110,8 +154,11 @@ def setup_database():
         balance REAL,
         fee REAL DEFAULT 0,
         source TEXT DEFAULT 'manual'
+    )''')
+    c.execute('''CREATE TABLE IF NOT EXISTS initial_balance (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
         balance REAL,
-        source TEXT DEFAULT 'manual'
+        timestamp TEXT
     )''')
     # Try to add the column if upgrading an old DB
     try:
@@ -122,6 +169,8 @@ def setup_database():
         c.execute("ALTER TABLE trades ADD COLUMN fee REAL DEFAULT 0")
     except sqlite3.OperationalError:
         pass
+    # Serves the open-position lookup: last sell and last buy by id, without scanning the table
+    c.execute("CREATE INDEX IF NOT EXISTS idx_trades_type_id ON trades(type, id DESC)")
     # Insert initial balance record if none exists
     c.execute("SELECT balance FROM initial_balance ORDER BY id DESC LIMIT 1")
     initial_record = c.fetchone()
@@ -131,7 +180,6 @@ def setup_database():
             (GENERAL_CONFIG["initial_capital"], datetime.utcnow().isoformat())
         )
     conn.commit()
-    conn.close()
 
 RATE_LIMIT_THRESHOLD = 2
 RATE_LIMIT_SLEEP = 3
@@ -188,6 +236,7 @@ def query_public_throttled(endpoint, *args, **kwargs):
         requests.Timeout: On request timeout.
     """
     rate_limit_throttle(endpoint)
+    kwargs.setdefault('timeout', API_TIMEOUT)
     return k.query_public(endpoint, *args, **kwargs)
 
 def query_private_throttled(endpoint, *args, **kwargs):
@@ -207,6 +256,7 @@ def query_private_throttled(endpoint, *args, **kwargs):
         requests.Timeout: On request timeout.
     """
     rate_limit_throttle(endpoint)
+    kwargs.setdefault('timeout', API_TIMEOUT)
     return k.query_private(endpoint, *args, **kwargs)
 
 @retry((requests.ConnectionError, requests.Timeout), tries=3, delay=2, backoff=2, logger=logger)
@@ -248,15 +298,21 @@ def get_latest_candle(pair, interval):
         logger.error(f"Exception in get_latest_candle: {e}")
         raise
 
-@retry(Exception, tries=3, delay=2, backoff=2, logger=logger)
-def save_trade(trade_type, price, volume, profit, balance, source='manual'):
+TRADE_INSERT_SQL = (
+    "INSERT INTO trades (timestamp, type, price, volume, profit, balance, fee, source) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+def save_trade(trade_type, price, volume, profit, balance, fee=0, source='manual'):
     try:
-        with DB_LOCK:
-            conn = sqlite3.connect(DB_FILE, check_same_thread=False)
+        # The connection's context manager rolls the transaction back if the insert fails
+        with DB_LOCK, _get_writer() as conn:
+            # Take the write lock up front instead of upgrading a deferred transaction, which
+            # can fail with SQLITE_BUSY; waits for a busy database are left to busy_timeout
+            conn.execute("BEGIN IMMEDIATE")
             c = conn.cursor()
             c.execute(
-                "INSERT INTO trades (timestamp, type, price, volume, profit, balance, fee, source) "
-                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                TRADE_INSERT_SQL,
                 (datetime.utcnow().isoformat(), trade_type, price, volume, profit, balance, fee, source)
             )
             conn.commit()
@@ -268,52 +324,195 @@ def save_trade(trade_type, price, volume, profit, balance, source='manual'):
         print(f"Warning: Failed to save trade to database: {e}. Continuing without saving.")
         return
 
+class TradeBatch:
+    """
+    Trades collected by trade_batch() and written together when the batch closes.
+    """
+    def __init__(self):
+        self.rows = []
+
+    def save(self, trade_type, price, volume, profit, balance, fee=0, source='manual'):
+        """
+        Queue a trade; takes the same arguments as save_trade.
+        """
+        self.rows.append((datetime.utcnow().isoformat(), trade_type, price, volume, profit, balance, fee, source))
+
+@retry((sqlite3.OperationalError, sqlite3.DatabaseError), tries=3, delay=2, backoff=2, logger=logger)
+def _insert_trades(rows):
+    """
+    Insert trade rows in one BEGIN IMMEDIATE transaction.
+
+    Args:
+        rows (list): Tuples in TRADE_INSERT_SQL column order.
+
+    Raises:
+        sqlite3.DatabaseError: If the insert fails; the transaction is rolled back.
+    """
+    with DB_LOCK, _get_writer() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany(TRADE_INSERT_SQL, rows)
+        conn.commit()
+
+@contextlib.contextmanager
+def trade_batch():
+    """
+    Group the trade writes of a cycle into a single transaction.
+
+    Trades queued with .save() are inserted in one BEGIN IMMEDIATE transaction when the
+    block exits, so the cycle pays for one commit however many rows it writes. Nothing is
+    written if the block raises. Like save_trade, a failed write is logged and the bot
+    continues.
+
+    Yields:
+        TradeBatch: Batch to queue trades on.
+    """
+    batch = TradeBatch()
+    yield batch
+    if not batch.rows:
+        return
+    try:
+        _insert_trades(batch.rows)
+        for timestamp, trade_type, price, volume, profit, balance, fee, source in batch.rows:
+            logger.info(
+                f"Trade saved: {trade_type} {volume} @ {price}, profit: {profit}, balance: {balance}, fee: {fee}, source: {source}"
+            )
+    except Exception as e:
+        logger.error(f"Exception in trade_batch: {e}")
+        print(f"Warning: Failed to save trades to database: {e}. Continuing without saving.")
+
 @retry((sqlite3.OperationalError, sqlite3.DatabaseError), tries=3, delay=2, backoff=2, logger=logger)
 def get_open_position():
     try:
-        with DB_LOCK:
-            conn = sqlite3.connect(DB_FILE, check_same_thread=False)
+        with DB_LOCK, _get_writer() as conn:
             c = conn.cursor()
-            # Find the last 'buy' operation without a subsequent 'sell'
+            # Find the last 'buy' operation without a subsequent 'sell': both lookups are
+            # served by idx_trades_type_id
             c.execute('''
-                SELECT id, timestamp, price, volume, balance
+                SELECT timestamp, price, volume, source
                 FROM trades
                 WHERE type = 'buy'
+                  AND id > COALESCE((SELECT MAX(id) FROM trades WHERE type = 'sell'), 0)
                 ORDER BY id DESC LIMIT 1
             ''')
-            last_buy = c.fetchone()
-            if last_buy:
-                buy_id, buy_time, buy_price, buy_volume, buy_balance = last_buy
-                # Check if there is a 'sell' after this 'buy'
-                c.execute('''
-                    SELECT id FROM trades
-                    WHERE type = 'sell' AND id > ?
-                    ORDER BY id ASC LIMIT 1
-                ''', (buy_id,))
-                sell = c.fetchone()
-                if not sell:
-                    logger.info(f"Open position found: entry {buy_price}, volume {buy_volume}")
-                    return {
-                        "entry_price": buy_price,
-                        "volume": buy_volume,
-                        "entry_time": pd.to_datetime(buy_time),
-                        # Fee/slippage/spread is not stored here, but you could if you save them in the table
-                    }
-            conn.close()
+            open_buy = c.fetchone()
+            if open_buy:
+                buy_time, buy_price, buy_volume, buy_source = open_buy
+                logger.info(f"Open position found: entry {buy_price}, volume {buy_volume}")
+                return {
+                    "entry_price": buy_price,
+                    "volume": buy_volume,
+                    "entry_time": pd.to_datetime(buy_time),
+                    "source": buy_source,
+                    # Fee/slippage/spread is not stored here, but you could if you save them in the table
+                }
         return None
+    except Exception as e:
+        logger.error(f"Exception in get_open_position: {e}")
+        raise
+
+PARQUET_FILE = os.path.join(BASE_DIR, "data", "ohlc_data_60min_all_years.parquet")
+OHLCV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# Resampled candles of the last load, reused until the parquet file is rewritten
+_last_mtime = None
+_cached_df_resampled = None
+_cached_interval = None
+
+def _read_resampled(interval, since=None):
+    """
+    Read 60min candles from the parquet file and resample them to the given interval.
+
+    Args:
+        interval (str): Resampling interval (e.g. '1D').
+        since (pandas.Timestamp, optional): Only read candles from this time on.
+
+    Returns:
+        pandas.DataFrame: OHLCV candles indexed by Timestamp.
+    """
+    filters = [('Timestamp', '>=', since)] if since is not None else None
+    df = pd.read_parquet(PARQUET_FILE, columns=['Timestamp'] + OHLCV_COLUMNS, filters=filters)
+    df["Timestamp"] = pd.to_datetime(df["Timestamp"])
+    df.set_index("Timestamp", inplace=True)
+    # Buckets are anchored on the epoch, not on the first candle read, so a read starting at
+    # the last cached bucket yields the same boundaries as the full read
+    return df.resample(interval, origin='epoch').agg({
+        'Open': 'first',
+        'High': 'max',
+        'Low': 'min',
+        'Close': 'last',
+        'Volume': 'sum'
+    }).dropna()
+
+def load_resampled_data(interval):
+    """
+    Load the 60min candles and resample them to the strategy interval.
+
+    The result is cached and reused as long as the parquet file's modification time is
+    unchanged, so cycles without a new candle skip the read and the resample. When the file
+    changes, only the candles from the last cached bucket on are read and resampled again.
+
+    Args:
+        interval (str): Resampling interval (e.g. '1D').
+
+    Returns:
+        pandas.DataFrame: OHLCV candles indexed by Timestamp.
+
+    Raises:
+        OSError: If the parquet file cannot be read.
+    """
+    global _last_mtime, _cached_df_resampled, _cached_interval
+    mtime = os.stat(PARQUET_FILE).st_mtime_ns
+    # Callers get a copy: Strategy.calculate_indicators adds columns and drops rows in place
+    if _cached_df_resampled is None or _cached_df_resampled.empty or interval != _cached_interval:
+        df_resampled = _read_resampled(interval)
+    elif mtime == _last_mtime:
+        return _cached_df_resampled.copy()
+    else:
+        # The updater only appends candles after the last one, so every bucket before the
+        # last cached (possibly incomplete) one is final. Weekly and month-end buckets are
+        # labelled by their right edge, so the re-read starts one interval before the last
+        # label to cover the whole bucket; the extra, partial bucket it yields is dropped.
+        last_label = _cached_df_resampled.index[-1]
+        history = _cached_df_resampled.loc[_cached_df_resampled.index < last_label]
+        recent = _read_resampled(interval, since=last_label - to_offset(interval))
+        df_resampled = pd.concat([history, recent.loc[recent.index >= last_label]])
+    _last_mtime = mtime
+    _cached_df_resampled = df_resampled
+    _cached_interval = interval
+    return df_resampled.copy()
+
+# data/update_data.py, loaded once on first use. It is loaded by path because the data/
+# directory is not a package (and `data` is taken by data.py).
+_updater = None
 
 def update_parquet():
-    update_script = os.path.join("data", "update_data.py")
+    """
+    Append the latest 60min candles to the parquet file by running the updater in-process.
+
+    Raises:
+        requests.ConnectionError: On connection failure while downloading trades.
+    """
+    global _updater
+    update_script = os.path.join(BASE_DIR, "data", "update_data.py")
     if not os.path.isfile(update_script):
         logger.warning(f"update_data.py not found at {update_script}. Skipping price update.")
         print(f"Warning: update_data.py not found at {update_script}. Skipping price update.")
         return
     print("Updating prices...")
-    with open(os.devnull, 'w') as devnull:
-        subprocess.run([
-            "python", update_script
-            "python", update_script
-        ], check=True, stdout=devnull, stderr=devnull)
+    if _updater is None:
+        spec = importlib.util.spec_from_file_location("update_data", update_script)
+        updater = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(updater)
+        # The updater's paths are relative to the working directory and its logger is only
+        # configured when it runs as a script: point both at the bot's
+        updater.output_file = PARQUET_FILE
+        updater.cache_dir = os.path.join(BASE_DIR, "data", ".cache", "trades")
+        updater.logger = logger.getChild("update_data")
+        # Kept only once fully set up, so a failed load is retried on the next cycle
+        _updater = updater
+    # The updater reports its progress on stdout; keep it off the bot's console
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        _updater.update()
 
 @retry((requests.ConnectionError, requests.Timeout), tries=3, delay=2, backoff=2, logger=logger)
 def get_realtime_price(pair):
@@ -493,6 +692,17 @@ def input_with_timeout(prompt, timeout):
     except (EOFError, KeyboardInterrupt):
         return ''
 
+def seconds_to_next_candle():
+    """
+    Seconds until the next INTERVAL candle closes, plus a small margin.
+
+    Returns:
+        float: Time to wait so the next cycle starts right after the candle close.
+    """
+    period = INTERVAL * 60
+    # The margin lets the exchange publish the closed candle before it is fetched
+    return period - (time.time() % period) + 0.2
+
 RUNNING = True
 def _signal_handler(sig, frame):
     """
@@ -517,7 +727,7 @@ def print_session_summary():
     Prints total trades, total profit, and win rate.
     """
     try:
-        with DB_LOCK, sqlite3.connect(DB_FILE) as conn:
+        with DB_LOCK, _get_writer() as conn:
             c = conn.cursor()
             c.execute("SELECT COUNT(*), COALESCE(SUM(profit),0) FROM trades")
             total_trades, total_profit = c.fetchone()
@@ -589,8 +799,7 @@ def main():
     setup_database()
     # Query last balance from DB (thread-safe)
     with DB_LOCK:
-        conn = sqlite3.connect(DB_FILE, check_same_thread=False)
-        c = conn.cursor()
+        c = _get_writer().cursor()
         c.execute('SELECT balance FROM trades ORDER BY id DESC LIMIT 1')
         last_balance = c.fetchone()
         if not last_balance:
@@ -629,28 +838,20 @@ def main():
                 logger.error(f"Error updating parquet data: {e}")
                 print("Warning: failed to update data, skipping cycle.")
             try:
-                df = pd.read_parquet(os.path.join(BASE_DIR, "data", "ohlc_data_60min_all_years.parquet"))
-                df["Timestamp"] = pd.to_datetime(df["Timestamp"])
-                df.set_index("Timestamp", inplace=True)
                 interval = CONFIG["data"]["interval"] if "data" in CONFIG and "interval" in CONFIG["data"] else "1D"
-                df_resampled = df.resample(interval).agg({
-                    'Open': 'first',
-                    'High': 'max',
-                    'Low': 'min',
-                    'Close': 'last',
-                    'Volume': 'sum'
-                }).dropna()
+                df_resampled = load_resampled_data(interval)
             except Exception as e:
                 logger.error(f"Error loading parquet data: {e}")
                 print("Warning: error loading parquet data, skipping cycle.")
-                time.sleep(INTERVAL * 60)
+                time.sleep(seconds_to_next_candle())
                 continue
 
             clear_console()
             for line in initial_summary:
                 print(line)
+            # One ticker request per cycle, shared by both status displays
+            realtime_price = get_realtime_price(PAIR)
             if position is not None:
-                realtime_price = get_realtime_price(PAIR)
                 if realtime_price:
                     pl_realtime = (realtime_price - position['entry_price']) * position['volume']
                     pl_realtime -= (position['entry_price'] + realtime_price) * position['volume'] * trade_fee
@@ -670,7 +871,6 @@ def main():
                     print(f"Current Balance: {balance_color}${equity:,.2f}{Style.RESET_ALL}")
                     print(Fore.CYAN + "="*40 + Style.RESET_ALL + "\n")
             else:
-                realtime_price = get_realtime_price(PAIR)
                 print("\n" + Fore.CYAN + "="*40 + Style.RESET_ALL)
                 print("\n" + Fore.CYAN + "="*40 + Style.RESET_ALL)
                 print(f"CYCLE {cycle} | {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} UTC\n")
@@ -702,7 +902,8 @@ def main():
                         entry_time = last_candle.name.to_pydatetime() if hasattr(last_candle.name, 'to_pydatetime') else last_candle.name
                     else:
                         entry_time = datetime.utcnow()
-                    save_trade('buy', auto_price, volume, 0, balance, source='auto')
+                    with trade_batch() as batch:
+                        batch.save('buy', auto_price, volume, 0, balance, source='auto')
                     position = {
                         'entry_price': auto_price,
                         'volume': volume,
@@ -717,7 +918,8 @@ def main():
                 pl = (auto_price - position['entry_price']) * position['volume']
                 pl -= (position['entry_price'] + auto_price) * position['volume'] * trade_fee
                 balance += (auto_price * position['volume']) + pl
-                save_trade('sell', auto_price, position['volume'], pl, balance, source='auto')
+                with trade_batch() as batch:
+                    batch.save('sell', auto_price, position['volume'], pl, balance, source='auto')
                 print(f"{Fore.MAGENTA}[AUTO]{Style.RESET_ALL} Auto SELL: {position['volume']:.6f} BTC @ ${auto_price:,.2f} | P/L: ${pl:,.2f}")
                 position = None
 
@@ -726,7 +928,7 @@ def main():
             print("[b] Buy at current price  ")
             print("[s] Sell (close position)  ")
             print("[q] Quit bot  \n")
-            user_input = input_with_timeout("Press Enter after choosing an option: ", INTERVAL * 60).strip().lower()
+            user_input = input_with_timeout("Press Enter after choosing an option: ", seconds_to_next_candle()).strip().lower()
             print()
 
             if user_input == 'q':
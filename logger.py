@@ -1,4 +1,5 @@
 import logging
+from functools import wraps
 
 def setup_logger():
     logger = logging.getLogger("cryptobot")
@@ -11,3 +12,25 @@ def setup_logger():
     return logger
 
 logger = setup_logger()
+
+def log_debug(func):
+    """
+    Log entry to and exit from the decorated function, and any exception it raises.
+    """
+    name = func.__name__
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        # Messages are only built when DEBUG is enabled
+        debug_on = logger.isEnabledFor(logging.DEBUG)
+        if debug_on:
+            logger.debug("Entering %s", name)
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            logger.exception("Exception in %s", name)
+            raise
+        if debug_on:
+            logger.debug("Exiting %s", name)
+        return result
+    return wrapper
@@ -1,7 +1,6 @@
 # main.py
 
-from logger import logger
-from functools import wraps
+from logger import logger, log_debug
 from tqdm import tqdm
 from colorama import Fore, Style
 from data import DataHandler
@@ -11,7 +10,6 @@ from datetime import datetime
 import json
 import os
 import shutil
-import logging
 import pandas as pd
 import numpy as np
 
@@ -19,19 +17,6 @@ import numpy as np
 with open("config.json", "r") as config_file:
     config = json.load(config_file)
 
-def log_debug(func):
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        logger.debug(f"Entering {func.__name__}")
-        try:
-            result = func(*args, **kwargs)
-            logger.debug(f"Exiting {func.__name__}")
-            return result
-        except Exception as e:
-            logger.exception(f"Exception in {func.__name__}")
-            raise
-    return wrapper
-
 @log_debug
 def clear_logs():
     """
@@ -176,6 +161,7 @@ if __name__ == "__main__":
                 start_date = config["data"]["start_date"]
                 end_date = config["data"]["end_date"]
                 interval = config["data"]["interval"]
+                float32 = config["data"].get("float32", False)
                 output_dir = config["data"]["output_dir"]
 
                 strategy_params = config["strategy"]
@@ -189,7 +175,7 @@ if __name__ == "__main__":
         logger.info("Step 3: Initializing data loading.")
         with tqdm(total=1, desc="Step 3: Load Data", ncols=100, ascii=".-") as pbar:
             try:
-                data_handler = DataHandler(file_path, start_date=start_date, end_date=end_date, interval=interval)
+                data_handler = DataHandler(file_path, start_date=start_date, end_date=end_date, interval=interval, float32=float32)
                 data = data_handler.load_data()
                 logger.debug("Data loaded successfully. Data shape: %s", data.shape)
                 print_status_with_progress("Step 3: Load Data", "OK", pbar)
@@ -1,13 +1,12 @@
 import optuna
 import json
 from data import DataHandler
-from strategy import Strategy
-from backtest import Backtester
+from backtest import run_backtest
+from concurrent.futures import ProcessPoolExecutor
 import os
 import warnings
 import datetime
 import logging
-from main import clean_old_results
 from logger import logger
 
 warnings.filterwarnings("ignore")
@@ -20,14 +19,18 @@ def clear_debug_log():
     except FileNotFoundError:
         pass
 
-clear_debug_log()  # Call the function to clear the log file
-
-# Configure logging to write to a file
-logging.basicConfig(
-    filename="debug.log",
-    level=logging.DEBUG,
-    format="%(asctime)s - %(levelname)s - %(message)s"
-)
+def setup_logging():
+    """
+    Clear debug.log and send the run's log records to it. Called from run_optimization
+    rather than at import: spawn/forkserver workers re-import this module, and would
+    otherwise truncate the log in the middle of the run.
+    """
+    clear_debug_log()
+    logging.basicConfig(
+        filename="debug.log",
+        level=logging.DEBUG,
+        format="%(asctime)s - %(levelname)s - %(message)s"
+    )
 
 # Configurar verbosidad de Optuna dependiendo de cómo se ejecuta el archivo
 if __name__ != "__main__":
@@ -46,6 +49,7 @@ file_path = base_config["data"]["data_file_path"]
 start_date = base_config["data"]["start_date"]
 end_date = base_config["data"]["end_date"]
 interval = base_config["data"]["interval"]
+float32 = base_config["data"].get("float32", False)
 initial_capital = base_config["general"]["initial_capital"]
 trade_fee = base_config["general"]["trade_fee"]
 investment_fraction = base_config["general"]["investment_fraction"]
@@ -54,10 +58,53 @@ spread = base_config["general"].get("spread", 0.00015)  # Default 0.015%
 n_trials = base_config["optimization"]["n_trials"]
 optimization_results_dir = base_config["optimization"]["optimization_results_dir"]
 results_cleanup_limit = base_config["general"]["results_cleanup_limit"]
+n_jobs = base_config["optimization"].get("n_jobs", 1)
+if n_jobs < 1:
+    n_jobs = os.cpu_count() or 1
+
+# OHLCV data shared by all trials, loaded once per process
+_base_data = None
+
+def load_base_data():
+    """
+    Load (and resample) the optimization data once; trials work on copies of it.
+    """
+    global _base_data
+    if _base_data is None:
+        data_handler = DataHandler(file_path, start_date, end_date, interval, float32)
+        _base_data = data_handler.load_data()
+    return _base_data
+
+def init_worker():
+    """
+    Worker process setup: load the data once and keep per-trade logging quiet.
+    """
+    logger.setLevel(logging.WARNING)
+    load_base_data()
+
+def evaluate(config):
+    """
+    Backtest one parameter set and return its metrics.
+    """
+    return run_backtest(
+        load_base_data(), config, initial_capital, trade_fee,
+        investment_fraction, spread, slippage
+    )
 
-def objective(trial):
+def record_metrics(trial, metrics):
+    """
+    Store the metrics on the trial and return the optimization target.
+    """
+    trial.set_user_attr("start_date", start_date)
+    trial.set_user_attr("end_date", end_date)
+    trial.set_user_attr("pl_percent", metrics["capital"]["pl_percent"])
+    trial.set_user_attr("sharpe_ratio", metrics["performance"]["sharpe_ratio"])
+    trial.set_user_attr("max_drawdown", metrics["performance"]["max_drawdown"])
+    return metrics["capital"]["pl_percent"]  # Maximize this metric
+
+def suggest_params(trial):
     # Test different combinations of hyperparameters
-    config = {
+    return {
         "sma_short": trial.suggest_int("sma_short", 5, 100),
         "sma_long": trial.suggest_int("sma_long", trial.params["sma_short"] + 1, 300),
         "rsi_period": trial.suggest_int("rsi_period", 5, 50),
@@ -87,58 +134,48 @@ def objective(trial):
         "resistance_margin": trial.suggest_float("resistance_margin", 0.90, 0.98)
     }
 
+def objective(trial):
+    config = suggest_params(trial)
     try:
-        # Load and prepare data
-        data_handler = DataHandler(file_path, start_date, end_date, interval)
-        data = data_handler.load_data()
-        if data.empty:
-            logger.error("Data is empty. Cannot proceed with trial.")
-            return -9999  # Penalize empty data
-
-        # Calculate indicators
-        strategy = Strategy(config)
-        strategy.calculate_indicators(data)
-        if data.isnull().any().any():
-            logger.warning("Data contains NaN values after calculating indicators.")
-
-        # Run backtest with the flag `from_optimize=True`
-        backtester = Backtester(
-            data=data,
-            strategy=strategy,
-            initial_capital=initial_capital,
-            trade_fee=trade_fee,
-            investment_fraction=investment_fraction,
-            from_optimize=True,  # Pass the flag
-            debug=True  # Enable debug mode for detailed logs
-        )
-        backtester.slippage = slippage
-        backtester.spread = spread
-
-        backtester.run()
-        if not backtester.trades:
-            logger.warning("No trades were executed during the backtest.")
-
-        metrics = backtester.calculate_metrics()
-        trial.set_user_attr("start_date", start_date)
-        trial.set_user_attr("end_date", end_date)
-        trial.set_user_attr("pl_percent", metrics["capital"]["pl_percent"])
-        trial.set_user_attr("sharpe_ratio", metrics["performance"]["sharpe_ratio"])
-        trial.set_user_attr("max_drawdown", metrics["performance"]["max_drawdown"])
-
-        return metrics["capital"]["pl_percent"]  # Maximize this metric
-
+        return record_metrics(trial, evaluate(config))
     except Exception as e:
         logger.error(f"Error during trial: {e}", exc_info=True)
         return -9999  # Penalize configurations that fail
 
+def optimize_parallel(study, callback=None):
+    """
+    Run the trials in batches of n_jobs across worker processes (ask/tell interface).
+    """
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=init_worker) as pool:
+        remaining = n_trials
+        while remaining > 0:
+            trials = [study.ask() for _ in range(min(n_jobs, remaining))]
+            futures = [pool.submit(evaluate, suggest_params(trial)) for trial in trials]
+            for trial, future in zip(trials, futures):
+                try:
+                    value = record_metrics(trial, future.result())
+                except Exception as e:
+                    logger.error(f"Error during trial: {e}", exc_info=True)
+                    value = -9999  # Penalize configurations that fail
+                frozen_trial = study.tell(trial, value)
+                if callback:
+                    callback(study, frozen_trial)
+            remaining -= len(trials)
+
 def run_optimization(callback=None):
+    # Imported here so worker processes importing this module do not load main.py
+    from main import clean_old_results
+    setup_logging()
     study = optuna.create_study(
         storage="sqlite:///optuna_study.db",
         study_name="trading_strategy",
         direction="maximize",
         load_if_exists=True
     )
-    study.optimize(objective, n_trials=n_trials, callbacks=[callback] if callback else None)
+    if n_jobs > 1:
+        optimize_parallel(study, callback)
+    else:
+        study.optimize(objective, n_trials=n_trials, callbacks=[callback] if callback else None)
     
     # Guardar resultados
     os.makedirs(optimization_results_dir, exist_ok=True)
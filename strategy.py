@@ -1,29 +1,47 @@
 # strategy.py
 
 import pandas as pd
+import numpy as np
 import json
-from logger import logger
-from functools import wraps
-
-def log_debug(func):
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        logger.debug(f"Entering {func.__name__}")
-        try:
-            result = func(*args, **kwargs)
-            logger.debug(f"Exiting {func.__name__}")
-            return result
-        except Exception as e:
-            logger.exception(f"Exception in {func.__name__}")
-            raise
-    return wrapper
+import logging
+from logger import logger, log_debug
+from types import MappingProxyType
+from engine import ewm_mean, rolling_high_low
 
 logger.debug("Starting execution of strategy.py")
 
 # Load strategy parameters from config.json
 with open("config.json", "r") as f:
     config = json.load(f)
-strategy_params = config["strategy"]
+# Read-only: the loaded parameters are shared by every Strategy instance
+strategy_params = MappingProxyType(config["strategy"])
+
+# Parameters kept as loaded (booleans and time_based_stop_loss_percent) or coerced to float;
+# every other parameter is an integer
+_UNCOERCED_KEYS = frozenset(["use_supertrend", "use_adx_positive", "use_macd_positive", "time_based_stop_loss_percent"])
+_FLOAT_KEYS = frozenset([
+    "stop_loss_atr_multiplier", "trailing_stop_percentage", "bollinger_std_dev",
+    "supertrend_multiplier", "stop_loss_multiplier", "take_profit_multiplier",
+    "resistance_margin", "support_margin"
+])
+
+def _coerce_param(key, value):
+    """
+    Convert a strategy parameter to the type the strategy expects.
+    """
+    if key in _UNCOERCED_KEYS:
+        return value
+    if key in _FLOAT_KEYS:
+        return float(value)
+    return int(value)
+
+# Defaults are coerced once at import; instances only convert the keys they override
+_typed_defaults = MappingProxyType({key: _coerce_param(key, value) for key, value in strategy_params.items()})
+
+# Indicator columns read by compute_signals; calculate_indicators leaves them out when the
+# data is shorter than the longest indicator period
+_SIGNAL_COLUMNS = ('sma_short', 'sma_long', 'macd', 'macd_signal', 'rsi', 'volume_sma', 'supertrend',
+                   'adx', 'atr', 'atr_sma', 'bollinger_lower', 'bollinger_upper')
 
 class Strategy:
     def __init__(self, config=None):
@@ -34,30 +52,16 @@ class Strategy:
         # Default configuration (updated with optimized parameters)
         self.default_config = strategy_params
 
-        # Use provided config if available, otherwise use default
-        self.config = self.default_config.copy()
-        if config is not None:
-            self.config.update(config)
-
-        # Validate all required keys are present
-        required_keys = list(self.default_config.keys())
-        missing_keys = [key for key in required_keys if key not in self.config]
-        if missing_keys:
-            raise KeyError(f"Missing required config keys: {missing_keys}")
-
-        # Validate and convert config types only once
-        for key, value in self.config.items():
-            if key in ["use_supertrend", "use_adx_positive", "use_macd_positive", "time_based_stop_loss_percent"]:
-                continue  # Skip validation for booleans and time_based_stop_loss_percent
-            float_keys = [
-                "stop_loss_atr_multiplier", "trailing_stop_percentage", "bollinger_std_dev",
-                "supertrend_multiplier", "stop_loss_multiplier", "take_profit_multiplier",
-                "resistance_margin", "support_margin"
-            ]
-            if key in float_keys:
-                self.config[key] = float(value)
-            else:
-                self.config[key] = int(value)
+        # Without overrides the read-only typed defaults are shared as they are; otherwise
+        # they are merged with the coerced overrides into a new dict, so every default key
+        # is present. Keys that are not strategy parameters are rejected.
+        if config:
+            unknown_keys = [key for key in config if key not in _typed_defaults]
+            if unknown_keys:
+                raise KeyError(f"Unknown config keys: {unknown_keys}")
+            self.config = {**_typed_defaults, **{key: _coerce_param(key, value) for key, value in config.items()}}
+        else:
+            self.config = _typed_defaults
 
         self.last_entry_time = None  # Track the last entry time to avoid same-candle exits
         self.position_open = False  # Track if a position is currently open
@@ -65,6 +69,17 @@ class Strategy:
         self.entry_price = None  # Track the entry price for stop-loss
         self.is_range_trading = False 
 
+    def indicator_signature(self):
+        """
+        Parameters that calculate_indicators depends on, as a hashable tuple.
+        Two configurations with the same signature produce the same indicator columns.
+        """
+        return tuple(self.config[key] for key in (
+            'sma_short', 'sma_long', 'rsi_period', 'macd_fast', 'macd_slow', 'macd_signal',
+            'atr_period', 'adx_period', 'volume_sma_period', 'bollinger_period',
+            'bollinger_std_dev', 'supertrend_multiplier'
+        ))
+
     @log_debug
     def calculate_indicators(self, data):
         """
@@ -96,24 +111,29 @@ class Strategy:
             data['sma_short'] = data['Close'].rolling(self.config['sma_short']).mean()
             data['sma_long'] = data['Close'].rolling(self.config['sma_long']).mean()
 
-            # Calculate RSI
+            # Calculate RSI (np.where keeps the first, NaN delta as 0 like Series.where)
             delta = data['Close'].diff()
-            gain = (delta.where(delta > 0, 0)).rolling(self.config['rsi_period']).mean()
-            loss = (-delta.where(delta < 0, 0)).rolling(self.config['rsi_period']).mean()
+            delta_values = delta.to_numpy()
+            gain = pd.Series(np.where(delta_values > 0, delta_values, 0.0), index=data.index).rolling(self.config['rsi_period']).mean()
+            loss = pd.Series(-np.where(delta_values < 0, delta_values, 0.0), index=data.index).rolling(self.config['rsi_period']).mean()
             rs = gain / loss
             data['rsi'] = 100 - (100 / (1 + rs))
 
             # Calculate MACD
-            ema_fast = data['Close'].ewm(span=self.config['macd_fast'], adjust=False).mean()
-            ema_slow = data['Close'].ewm(span=self.config['macd_slow'], adjust=False).mean()
-            data['macd'] = ema_fast - ema_slow
-            data['macd_signal'] = data['macd'].ewm(span=self.config['macd_signal'], adjust=False).mean()
+            close = data['Close'].to_numpy(dtype=np.float64)
+            ema_fast = ewm_mean(close, self.config['macd_fast'])
+            ema_slow = ewm_mean(close, self.config['macd_slow'])
+            macd = ema_fast - ema_slow
+            data['macd'] = macd
+            data['macd_signal'] = ewm_mean(macd, self.config['macd_signal'])
 
             # Calculate ATR
-            high_low = data['High'] - data['Low']
-            high_close = (data['High'] - data['Close'].shift()).abs()
-            low_close = (data['Low'] - data['Close'].shift()).abs()
-            tr = high_low.combine(high_close, max).combine(low_close, max)
+            high = data['High'].to_numpy()
+            low = data['Low'].to_numpy()
+            prev_close = np.concatenate(([np.nan], data['Close'].to_numpy()[:-1]))
+            # fmax (not maximum) so the first candle's TR is high - low rather than NaN
+            tr = np.fmax.reduce([high - low, np.abs(high - prev_close), np.abs(low - prev_close)])
+            tr = pd.Series(tr, index=data.index)
             data['atr'] = tr.rolling(self.config['atr_period']).mean()
 
             # Calculate ATR moving average for volatility filter
@@ -122,18 +142,23 @@ class Strategy:
             # Calculate ADX
             plus_dm = (data['High'] - data['High'].shift()).clip(lower=0)
             minus_dm = (data['Low'].shift() - data['Low']).clip(lower=0)
-            plus_di = 100 * (plus_dm.ewm(span=self.config['adx_period'], adjust=False).mean() / data['atr'])
-            minus_di = 100 * (minus_dm.ewm(span=self.config['adx_period'], adjust=False).mean() / data['atr'])
-            dx = 100 * (plus_di - minus_di).abs() / (plus_di + minus_di)
-            data['adx'] = dx.ewm(span=self.config['adx_period'], adjust=False).mean()
+            plus_dm_smooth = ewm_mean(plus_dm.to_numpy(dtype=np.float64), self.config['adx_period'])
+            minus_dm_smooth = ewm_mean(minus_dm.to_numpy(dtype=np.float64), self.config['adx_period'])
+            # The +DI/-DI division by ATR cancels in DX, so DX is taken from the smoothed DMs.
+            # DX stays NaN until ATR is available so the ADX warm-up starts where it always has.
+            with np.errstate(divide='ignore', invalid='ignore'):  # Flat stretches give 0/0, as in pandas
+                dx = 100 * np.abs(plus_dm_smooth - minus_dm_smooth) / (plus_dm_smooth + minus_dm_smooth)
+            dx[np.isnan(data['atr'].to_numpy())] = np.nan
+            data['adx'] = ewm_mean(dx, self.config['adx_period'])
 
             # Calculate Volume SMA
             data['volume_sma'] = data['Volume'].rolling(self.config['volume_sma_period']).mean()
 
             # Calculate Bollinger Bands
             data['bollinger_mid'] = data['Close'].rolling(self.config['bollinger_period']).mean()
-            data['bollinger_upper'] = data['bollinger_mid'] + (data['Close'].rolling(self.config['bollinger_period']).std() * self.config['bollinger_std_dev'])
-            data['bollinger_lower'] = data['bollinger_mid'] - (data['Close'].rolling(self.config['bollinger_period']).std() * self.config['bollinger_std_dev'])
+            bollinger_band = data['Close'].rolling(self.config['bollinger_period']).std() * self.config['bollinger_std_dev']
+            data['bollinger_upper'] = data['bollinger_mid'] + bollinger_band
+            data['bollinger_lower'] = data['bollinger_mid'] - bollinger_band
 
             # Calculate Supertrend (used only if use_supertrend is True)
             atr = data['atr']
@@ -142,17 +167,16 @@ class Strategy:
             data['supertrend_lower'] = hl2 - (self.config['supertrend_multiplier'] * atr)
             data['supertrend'] = (data['Close'] > data['supertrend_lower']).astype(int)
 
-            # Calculate Ichimoku Cloud
-            high_9 = data['High'].rolling(window=9).max()
-            low_9 = data['Low'].rolling(window=9).min()
+            # Calculate Ichimoku Cloud (highest high and lowest low of each window in one pass)
+            high_values = data['High'].to_numpy(dtype=np.float64)
+            low_values = data['Low'].to_numpy(dtype=np.float64)
+            high_9, low_9 = rolling_high_low(high_values, low_values, 9)
             data['tenkan_sen'] = (high_9 + low_9) / 2
-            high_26 = data['High'].rolling(window=26).max()
-            low_26 = data['Low'].rolling(window=26).min()
+            high_26, low_26 = rolling_high_low(high_values, low_values, 26)
             data['kijun_sen'] = (high_26 + low_26) / 2
             data['senkou_span_a'] = ((data['tenkan_sen'] + data['kijun_sen']) / 2).shift(26)
-            high_52 = data['High'].rolling(window=52).max()
-            low_52 = data['Low'].rolling(window=52).min()
-            data['senkou_span_b'] = ((high_52 + low_52) / 2).shift(26)
+            high_52, low_52 = rolling_high_low(high_values, low_values, 52)
+            data['senkou_span_b'] = pd.Series((high_52 + low_52) / 2, index=data.index).shift(26)
             data['chikou_span'] = data['Close'].shift(-26)
 
             # Drop NaN values after all calculations
@@ -165,77 +189,155 @@ class Strategy:
             raise
 
     @log_debug
+    def compute_signals(self, data):
+        """
+        Evaluate the entry and exit rules over the whole DataFrame in one vectorized pass.
+        Mirrors entry_signal/exit_signal; the parts of the exit that depend on the open
+        position (trailing stop, stop-loss, take-profit, time-based stop) are returned as
+        per-candle inputs so the backtester can resolve them against the entry.
+        :param data: DataFrame with indicators already calculated.
+        :return: DataFrame aligned with data with columns:
+                 'entry' (bool), 'range_entry' (bool, entry taken in range trading mode),
+                 'exit' (bool, trend exit independent of the position),
+                 'range_exit' (bool, range trading exit),
+                 'stop_distance' and 'take_profit_distance' (float, ATR based offsets from the entry price).
+                 Without indicator columns (data too short) no candle enters or exits.
+        """
+        missing_columns = [column for column in _SIGNAL_COLUMNS if column not in data.columns]
+        if missing_columns:
+            logger.warning(f"Indicator columns missing, no signals generated: {missing_columns}")
+            no_signal = np.zeros(len(data), dtype=bool)
+            return pd.DataFrame({
+                'entry': no_signal,
+                'range_entry': no_signal,
+                'exit': no_signal,
+                'range_exit': no_signal,
+                'stop_distance': np.full(len(data), np.nan),
+                'take_profit_distance': np.full(len(data), np.nan)
+            }, index=data.index)
+
+        close = data['Close']
+        volume = data['Volume']
+
+        # Detect sideways market
+        lateral_market = data['adx'] < self.config['lateral_adx_threshold']
+
+        # Range trading conditions
+        range_pass = (
+            lateral_market &
+            (close < data['bollinger_lower'] * self.config['support_margin'] * 1.02) &
+            (volume > 1.5 * data['volume_sma']) &
+            (data['rsi'] > 20)
+        )
+
+        # Trend trading conditions
+        above = data['sma_short'] > data['sma_long']
+        prev_above = (data['sma_short'].shift(1) > data['sma_long'].shift(1))
+        trend_main_pass = (
+            (above & prev_above) &
+            (data['macd'] > data['macd_signal'] - self.config['macd_threshold']) &
+            (data['rsi'] < self.config['rsi_threshold'])
+        )
+        trend_secondary_count = (
+            (volume > 1.2 * data['volume_sma']).astype(int) +
+            ((data['supertrend'] == 1) | (not self.config['use_supertrend'])).astype(int) +
+            ((data['adx'] > self.config['adx_threshold']) | (not self.config['use_adx_positive'])).astype(int) +
+            ((data['macd'] > 0) | (not self.config['use_macd_positive'])).astype(int) +
+            (data['atr'] > data['atr_sma']).astype(int)
+        )
+        trend_pass = ~lateral_market & trend_main_pass & (trend_secondary_count >= 3)
+
+        entry = range_pass | trend_pass
+        # The first candle has no previous candle to confirm the crossover
+        entry.iloc[:1] = False
+
+        supertrend_exit = (data['supertrend'] == 0) & self.config['use_supertrend']
+        trend_exit = (data['macd'] < data['macd_signal'] - self.config['macd_threshold']) | supertrend_exit
+
+        return pd.DataFrame({
+            'entry': entry,
+            'range_entry': entry & lateral_market,
+            'exit': trend_exit,
+            'range_exit': close > data['bollinger_upper'] * self.config['resistance_margin'],
+            'stop_distance': self.config['stop_loss_atr_multiplier'] * data['atr'] * self.config['stop_loss_multiplier'],
+            'take_profit_distance': self.config['stop_loss_atr_multiplier'] * data['atr'] * self.config['take_profit_multiplier']
+        }, index=data.index)
+
     def entry_signal(self, row, data):
         """
         Generate entry signal based on indicators.
+        Called once per candle, so it is not wrapped in log_debug.
         :param row: Current row of data (Series).
         :param data: Full DataFrame to access previous values.
         :return: True if entry signal is triggered, False otherwise.
         """
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Entering entry_signal")
         try:
             if row.get('entry_signal_generated', False) or self.position_open:
                 return False
-            idx = row.name
-            if idx not in data.index or data.index.get_loc(idx) < 1:
+            # One index lookup; the previous candle is then read by position
+            try:
+                pos = data.index.get_loc(row.name)
+            except KeyError:
+                return False
+            if pos < 1:
                 return False
-            prev_idx_1 = data.index[data.index.get_loc(idx) - 1]
-            prev_sma_short_1 = data.loc[prev_idx_1, 'sma_short']
-            prev_sma_long_1 = data.loc[prev_idx_1, 'sma_long']
+            prev_sma_short_1 = data['sma_short'].iat[pos - 1]
+            prev_sma_long_1 = data['sma_long'].iat[pos - 1]
             
             # Detect sideways market
             lateral_market = row['adx'] < self.config['lateral_adx_threshold']
             
-            # Range trading conditions
-            range_conditions = {
-                "lateral_market": lateral_market,
-                "buy_near_support": row['Close'] < row['bollinger_lower'] * self.config['support_margin'] * 1.02,  # More margin
-                "volume_confirmation": row['Volume'] > 1.5 * row['volume_sma'],  # Stricter volume filter
-                "rsi_not_oversold": row['rsi'] > 20  # Avoid extreme oversold
-            }
-            
-            # Trend trading conditions
-            trend_conditions = {
-                "sma_crossover": row['sma_short'] > row['sma_long'] and prev_sma_short_1 > prev_sma_long_1,
-                "macd_above_signal": row['macd'] > row['macd_signal'] - self.config['macd_threshold'],
-                "rsi_below_threshold": row['rsi'] < self.config['rsi_threshold'],
-                "volume_above_sma": row['Volume'] > 1.2 * row['volume_sma'],
-                "supertrend_uptrend": not self.config['use_supertrend'] or row['supertrend'] == 1,
-                "adx_trend": not self.config['use_adx_positive'] or row['adx'] > self.config['adx_threshold'],
-                "macd_positive": not self.config['use_macd_positive'] or row['macd'] > 0,
-                "volatility_filter": row['atr'] > row['atr_sma']
-            }
-            
-            # Decide trading mode
+            # Decide trading mode. Only the conditions of the active mode are built.
             if lateral_market:
                 # Only evaluate range trading conditions in sideways market
-                signal = all(range_conditions.values())
+                conditions = {
+                    "lateral_market": lateral_market,
+                    "buy_near_support": row['Close'] < row['bollinger_lower'] * self.config['support_margin'] * 1.02,  # More margin
+                    "volume_confirmation": row['Volume'] > 1.5 * row['volume_sma'],  # Stricter volume filter
+                    "rsi_not_oversold": row['rsi'] > 20  # Avoid extreme oversold
+                }
+                signal = all(conditions.values())
                 self.is_range_trading = signal
             else:
                 # Only evaluate trend trading conditions in non-sideways markets
+                conditions = {
+                    "sma_crossover": row['sma_short'] > row['sma_long'] and prev_sma_short_1 > prev_sma_long_1,
+                    "macd_above_signal": row['macd'] > row['macd_signal'] - self.config['macd_threshold'],
+                    "rsi_below_threshold": row['rsi'] < self.config['rsi_threshold'],
+                    "volume_above_sma": row['Volume'] > 1.2 * row['volume_sma'],
+                    "supertrend_uptrend": not self.config['use_supertrend'] or row['supertrend'] == 1,
+                    "adx_trend": not self.config['use_adx_positive'] or row['adx'] > self.config['adx_threshold'],
+                    "macd_positive": not self.config['use_macd_positive'] or row['macd'] > 0,
+                    "volatility_filter": row['atr'] > row['atr_sma']
+                }
                 trend_main_conditions = ["sma_crossover", "macd_above_signal", "rsi_below_threshold"]
                 trend_secondary_conditions = ["volume_above_sma", "supertrend_uptrend", "adx_trend", "macd_positive", "volatility_filter"]
-                trend_main_pass = all(trend_conditions[cond] for cond in trend_main_conditions)
-                trend_secondary_pass = sum(trend_conditions[cond] for cond in trend_secondary_conditions) >= 3
+                trend_main_pass = all(conditions[cond] for cond in trend_main_conditions)
+                trend_secondary_pass = sum(conditions[cond] for cond in trend_secondary_conditions) >= 3
                 signal = trend_main_pass and trend_secondary_pass
                 self.is_range_trading = False
             
             if signal:
-                logger.info(f"Entry signal generated at {row.name} (Range Trading: {self.is_range_trading})")
+                logger.info("Entry signal generated at %s (Range Trading: %s)", row.name, self.is_range_trading)
                 # row['entry_signal_generated'] = True  # Commented to avoid SettingWithCopyWarning. Does not affect main logic.
                 self.last_entry_time = row.name
                 self.position_open = True
                 self.highest_price = row['Close']
                 self.entry_price = row['Close']
-            else:
-                failed_conditions = [key for key, value in (trend_conditions | range_conditions).items() if not value]
-                logger.debug(f"Entry signal failed at {row.name}. Failed conditions: {failed_conditions}")
+            elif logger.isEnabledFor(logging.DEBUG):
+                failed_conditions = [key for key, value in conditions.items() if not value]
+                logger.debug("Entry signal failed at %s. Failed conditions: %s", row.name, failed_conditions)
             return signal
         except Exception as e:
             logger.error(f"Error in entry_signal: {e}")
             return False
 
-    @log_debug
     def exit_signal(self, row, data):
+        # Called once per candle, so it is not wrapped in log_debug
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Entering exit_signal")
         try:
             if row.get('exit_signal_generated', False) or not self.position_open or self.last_entry_time == row.name:
                 return False
@@ -270,7 +372,7 @@ class Strategy:
             signal = range_exit if self.is_range_trading else trend_exit
 
             if signal:
-                logger.info(f"Exit signal generated at {row.name} (Range Trading: {self.is_range_trading})")
+                logger.info("Exit signal generated at %s (Range Trading: %s)", row.name, self.is_range_trading)
                 row['exit_signal_generated'] = True
                 self.last_entry_time = None
                 self.position_open = False
@@ -0,0 +1,208 @@
+import unittest
+from collections import OrderedDict
+from unittest.mock import patch
+import numpy as np
+import pandas as pd
+import backtest
+from backtest import Backtester, run_backtest
+from data import DataHandler
+from strategy import Strategy
+
+# Parameters of the fixture below; supertrend/ADX/MACD-positive filters are off so that
+# entries only depend on the SMA crossover (trend) or the Bollinger/volume setup (range)
+FIXTURE_CONFIG = {
+    "use_supertrend": False,
+    "use_adx_positive": False,
+    "use_macd_positive": False,
+    "lateral_adx_threshold": 25,
+    "adx_threshold": 30,
+    "macd_threshold": 1,
+    "rsi_threshold": 70,
+    "support_margin": 1.0,
+    "resistance_margin": 1.0,
+    "trailing_stop_percentage": 0.1,
+    "stop_loss_atr_multiplier": 1.0,
+    "stop_loss_multiplier": 2.0,
+    "take_profit_multiplier": 3.0,
+    "time_based_stop_days": 4,
+    "time_based_stop_loss_percent": -3.0,
+}
+
+# (entry row, exit row) of every trade the fixture produces, and what closes it
+EXPECTED_TRADES = [
+    (2, 11),   # Trailing stop: 107 < 0.9 * 120
+    (14, 18),  # ATR take-profit: 131 > 100 + 3 * 10
+    (21, 26),  # ATR stop-loss: 97.5 < 100 - 2 * 1
+    (30, 31),  # Time-based stop: -4% one day after entry
+    (34, 36),  # Trend exit: MACD below its signal
+    (40, 44),  # Range exit: close above the upper Bollinger band
+    (48, 51),  # Still open on the last candle: forced close
+]
+
+def make_fixture():
+    """
+    Daily candles with hand-set indicator columns, built so each exit rule fires once.
+    """
+    n = 52
+    index = pd.date_range("2024-01-01", periods=n, freq="D")
+    data = pd.DataFrame({
+        'Close': np.full(n, 100.0),
+        'Volume': np.full(n, 100.0),
+        'sma_short': np.full(n, 1.0),
+        'sma_long': np.full(n, 2.0),
+        'macd': np.zeros(n),
+        'macd_signal': np.zeros(n),
+        'rsi': np.full(n, 50.0),
+        'volume_sma': np.full(n, 100.0),
+        'supertrend': np.ones(n, dtype=int),
+        'adx': np.full(n, 30.0),
+        'atr': np.full(n, 10.0),
+        'atr_sma': np.full(n, 10.0),
+        'bollinger_lower': np.zeros(n),
+        'bollinger_upper': np.full(n, 1000.0),
+    }, index=index)
+    data['Open'] = data['Close']
+    data['High'] = data['Close']
+    data['Low'] = data['Close']
+
+    def trend_entry(row):
+        data.iloc[row - 1:row + 1, data.columns.get_loc('sma_short')] = 3.0
+
+    # Trailing stop
+    trend_entry(2)
+    data.iloc[3:11, data.columns.get_loc('Close')] = [102, 104, 106, 108, 110, 114, 118, 120]
+    data.iloc[11, data.columns.get_loc('Close')] = 107
+    # ATR take-profit
+    trend_entry(14)
+    data.iloc[15:19, data.columns.get_loc('Close')] = [105, 112, 120, 131]
+    # ATR stop-loss, after the time-based stop window
+    trend_entry(21)
+    data.iloc[21:27, data.columns.get_loc('atr')] = 1.0
+    data.iloc[22:26, data.columns.get_loc('Close')] = 100.5
+    data.iloc[26, data.columns.get_loc('Close')] = 97.5
+    # Time-based stop
+    trend_entry(30)
+    data.iloc[31, data.columns.get_loc('Close')] = 96
+    # Trend exit
+    trend_entry(34)
+    data.iloc[36, data.columns.get_loc('macd')] = -5
+    # Range entry and exit; the drop on row 42 would trip the trend stops but not a range trade
+    data.iloc[40, data.columns.get_loc('adx')] = 20
+    data.iloc[40, data.columns.get_loc('bollinger_lower')] = 100
+    data.iloc[40, data.columns.get_loc('Volume')] = 200
+    data.iloc[42, data.columns.get_loc('Close')] = 85
+    data.iloc[44, data.columns.get_loc('bollinger_upper')] = 100
+    data.iloc[44, data.columns.get_loc('Close')] = 101
+    # Left open until the end
+    trend_entry(48)
+    data.iloc[49:52, data.columns.get_loc('Close')] = 101
+    return data
+
+def run_per_row(data, strategy, capital, trade_fee, investment_fraction, spread, slippage):
+    """
+    Reference walk calling entry_signal/exit_signal on every candle, as the backtester did
+    before the compiled kernel. Returns (entry rows, exit rows, profits).
+    """
+    entries, exits, profits = [], [], []
+    position = None
+    for i, (timestamp, row) in enumerate(data.iterrows()):
+        if position is None:
+            if strategy.entry_signal(row, data):
+                entry_price = row['Close'] * (1 + spread + slippage)
+                position = (i, entry_price, capital * investment_fraction / entry_price)
+            continue
+        if strategy.exit_signal(row, data):
+            exit_price = row['Close'] * (1 - spread - slippage)
+        elif i == len(data) - 1:
+            exit_price = row['Close'] * (1 - spread - slippage)
+        else:
+            continue
+        entry_row, entry_price, shares = position
+        profit = (exit_price - entry_price) * shares - (entry_price + exit_price) * shares * trade_fee
+        capital += profit
+        entries.append(entry_row)
+        exits.append(i)
+        profits.append(profit)
+        position = None
+        strategy.position_open = False
+    return entries, exits, profits
+
+class TestSimulate(unittest.TestCase):
+    def setUp(self):
+        self.data = make_fixture()
+        self.capital = 1000.0
+        self.trade_fee = 0.0026
+        self.investment_fraction = 0.9
+        self.spread = 0.00015
+        self.slippage = 0.0001
+
+    def test_per_row_reference_covers_every_exit(self):
+        entries, exits, _ = run_per_row(self.data, Strategy(FIXTURE_CONFIG), self.capital, self.trade_fee,
+                                        self.investment_fraction, self.spread, self.slippage)
+        self.assertEqual(list(zip(entries, exits)), EXPECTED_TRADES)
+
+    def test_simulate_matches_per_row_signals(self):
+        entries, exits, profits = run_per_row(self.data, Strategy(FIXTURE_CONFIG), self.capital, self.trade_fee,
+                                              self.investment_fraction, self.spread, self.slippage)
+        backtester = Backtester(self.data, Strategy(FIXTURE_CONFIG), self.capital, self.trade_fee,
+                                self.investment_fraction, from_optimize=True)
+        backtester.spread = self.spread
+        backtester.slippage = self.slippage
+        backtester.run()
+        self.assertEqual(backtester._entry_idx.tolist(), entries)
+        self.assertEqual(backtester._exit_idx.tolist(), exits)
+        np.testing.assert_allclose(backtester._profit, profits, rtol=1e-12)
+        self.assertAlmostEqual(backtester.final_capital, self.capital + sum(profits), places=9)
+
+    def test_data_shorter_than_indicators_has_no_trades(self):
+        # calculate_indicators skips data shorter than its longest period, leaving no indicator columns
+        data = self.data[['Open', 'High', 'Low', 'Close', 'Volume']].iloc[:20].copy()
+        strategy = Strategy(FIXTURE_CONFIG)
+        strategy.calculate_indicators(data)
+        self.assertNotIn('adx', data.columns)
+        backtester = Backtester(data, strategy, self.capital, self.trade_fee,
+                                self.investment_fraction, from_optimize=True)
+        backtester.run()
+        self.assertEqual(len(backtester._profit), 0)
+        self.assertEqual(backtester.final_capital, self.capital)
+        self.assertEqual(backtester.calculate_metrics()['trades']['number_of_trades'], 0)
+
+class TestRunBacktestCache(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.data = DataHandler("data/ohlc_data_60min_all_years.parquet", "2022-01-01", "2024-12-31", "1D").load_data()
+
+    def setUp(self):
+        self.cache_patch = patch.object(backtest, '_indicator_cache', OrderedDict())
+        self.cache_patch.start()
+
+    def tearDown(self):
+        self.cache_patch.stop()
+
+    def run_backtest(self, data):
+        return run_backtest(data, {}, 1000.0, 0.0026, 0.9, 0.00015, 0.0001)
+
+    def test_caller_frame_is_not_modified(self):
+        data = self.data.copy()
+        first = self.run_backtest(data)
+        pd.testing.assert_frame_equal(data, self.data)
+        # The second call is served from the cache
+        second = self.run_backtest(data)
+        pd.testing.assert_frame_equal(data, self.data)
+        self.assertEqual(len(backtest._indicator_cache), 1)
+        self.assertEqual(first, second)
+
+    def test_same_span_different_data_is_not_reused(self):
+        self.run_backtest(self.data.copy())
+        self.run_backtest(self.data.astype('float32'))
+        shifted = self.data.copy()
+        shifted[['Open', 'High', 'Low', 'Close']] *= 1.5
+        shifted.iloc[::7, shifted.columns.get_loc('Close')] *= 0.9
+        cached = self.run_backtest(shifted)
+        self.assertEqual(len(backtest._indicator_cache), 3)
+
+        backtest._indicator_cache.clear()
+        self.assertEqual(cached, self.run_backtest(shifted))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+import numpy as np
+import pandas as pd
+from engine import ewm_mean, rolling_high_low
+
+class TestEwmMean(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.values = 100 + np.cumsum(rng.normal(0, 1, 500))
+
+    def assert_matches_pandas(self, values, span):
+        expected = pd.Series(values).ewm(span=span, adjust=False).mean().to_numpy()
+        np.testing.assert_array_equal(ewm_mean(values, span), expected)
+
+    def test_matches_pandas(self):
+        for span in (2, 9, 26, 100):
+            self.assert_matches_pandas(self.values, span)
+
+    def test_matches_pandas_with_leading_nans(self):
+        values = self.values.copy()
+        values[:30] = np.nan
+        for span in (2, 9, 26):
+            self.assert_matches_pandas(values, span)
+
+    def test_matches_pandas_with_interior_nans(self):
+        values = self.values.copy()
+        values[:5] = np.nan
+        values[[40, 41, 42, 120, 300]] = np.nan
+        values[200:260] = np.nan
+        for span in (2, 9, 26):
+            self.assert_matches_pandas(values, span)
+
+    def test_empty_and_all_nan(self):
+        self.assert_matches_pandas(np.array([], dtype=np.float64), 9)
+        self.assert_matches_pandas(np.full(10, np.nan), 9)
+
+class TestRollingHighLow(unittest.TestCase):
+    def test_matches_pandas_rolling(self):
+        rng = np.random.default_rng(11)
+        close = 100 + np.cumsum(rng.normal(0, 1, 400))
+        high = close + rng.uniform(0, 2, 400)
+        low = close - rng.uniform(0, 2, 400)
+        for window in (1, 9, 26, 52):
+            highest, lowest = rolling_high_low(high, low, window)
+            np.testing.assert_array_equal(highest, pd.Series(high).rolling(window).max().to_numpy())
+            np.testing.assert_array_equal(lowest, pd.Series(low).rolling(window).min().to_numpy())
+
+    def test_window_longer_than_data(self):
+        highest, lowest = rolling_high_low(np.arange(5.0), np.arange(5.0), 9)
+        self.assertTrue(np.isnan(highest).all())
+        self.assertTrue(np.isnan(lowest).all())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,13 @@
+import os
+import shutil
+import tempfile
 import unittest
 from unittest.mock import patch, MagicMock
 import sqlite3
+import numpy as np
+import pandas as pd
+import live_paper
+from data import DataHandler
 from live_paper import simulate_order, get_realtime_price, save_trade, get_open_position
 
 class TestLivePaper(unittest.TestCase):
@@ -9,6 +16,11 @@ class TestLivePaper(unittest.TestCase):
         self.pair = "XXBTZUSD"
         self.volume = 0.0001
         self.price = 85000.0
+        # The bot keeps one shared connection; reset it so each test opens it through its mock
+        live_paper._WRITER = None
+
+    def tearDown(self):
+        live_paper._WRITER = None
 
     @patch('live_paper.query_private_throttled')
     def test_simulate_order_success(self, mock_query):
@@ -72,8 +84,7 @@ class TestLivePaper(unittest.TestCase):
         mock_connect.return_value.__enter__.return_value = mock_conn
         mock_conn.cursor.return_value = mock_cursor
         mock_cursor.fetchone.side_effect = [
-            (1, '2023-10-01T00:00:00', self.price, self.volume, 10000.0, 'auto'),
-            None  # No sell after buy
+            ('2023-10-01T00:00:00', self.price, self.volume, 'auto')  # Buy with no sell after it
         ]
         position = get_open_position()
         self.assertIsNotNone(position)
@@ -106,8 +117,7 @@ class TestLivePaper(unittest.TestCase):
         mock_connect.return_value.__enter__.return_value = mock_conn
         mock_conn.cursor.return_value = mock_cursor
         mock_cursor.fetchone.side_effect = [
-            (1, '2023-10-01T00:00:00', self.price, self.volume, 10000.0, 'auto'),
-            (2,)  # Sell exists after buy
+            None  # The last buy is followed by a sell, so the query matches no row
         ]
         position = get_open_position()
         self.assertIsNone(position)
@@ -126,5 +136,142 @@ class TestLivePaper(unittest.TestCase):
         with self.assertRaises(ValueError):
             get_open_position()
 
+class TestTradeBatch(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_patch = patch.object(live_paper, 'DB_FILE', os.path.join(self.tmp_dir, "trades.db"))
+        self.db_patch.start()
+        live_paper._WRITER = None
+        live_paper.setup_database()
+
+    def tearDown(self):
+        live_paper._WRITER.close()
+        live_paper._WRITER = None
+        self.db_patch.stop()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def saved_trades(self):
+        with sqlite3.connect(live_paper.DB_FILE) as conn:
+            return conn.execute("SELECT type, price, volume, source FROM trades ORDER BY id").fetchall()
+
+    def test_queued_trades_commit_together(self):
+        writer = live_paper._get_writer()
+        with patch.object(live_paper, '_get_writer', return_value=writer) as mock_writer:
+            with live_paper.trade_batch() as batch:
+                batch.save('sell', 85000.0, 0.01, 12.5, 1012.5, source='auto')
+                batch.save('buy', 85100.0, 0.02, 0, 1012.5, source='auto')
+                # Nothing is written until the block exits
+                self.assertEqual(self.saved_trades(), [])
+        mock_writer.assert_called_once()
+        self.assertEqual(self.saved_trades(), [('sell', 85000.0, 0.01, 'auto'), ('buy', 85100.0, 0.02, 'auto')])
+
+    def test_nothing_written_when_block_raises(self):
+        with self.assertRaises(RuntimeError):
+            with live_paper.trade_batch() as batch:
+                batch.save('buy', 85000.0, 0.01, 0, 1000.0, source='auto')
+                raise RuntimeError("order failed")
+        self.assertEqual(self.saved_trades(), [])
+
+    def test_failed_insert_is_rolled_back(self):
+        # The second row reuses the id of the first, so the insert fails halfway through
+        with patch.object(live_paper, 'TRADE_INSERT_SQL',
+                          "INSERT INTO trades (id, type, price, volume, profit, balance, fee, source) "
+                          "VALUES (1, ?, ?, ?, ?, ?, ?, ?)"):
+            with self.assertRaises(sqlite3.IntegrityError):
+                live_paper._insert_trades([('buy', 85000.0, 0.01, 0, 1000.0, 0, 'auto')] * 2)
+        self.assertEqual(self.saved_trades(), [])
+
+# Stand-in for data/update_data.py that fails to load while the flag file exists
+FAKE_UPDATER = """
+import os
+if os.path.exists(os.path.join(os.path.dirname(__file__), "fail")):
+    raise RuntimeError("load failed")
+output_file = cache_dir = logger = None
+updated = []
+def update():
+    updated.append(output_file)
+"""
+
+class TestUpdateParquet(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.tmp_dir, "data"))
+        with open(os.path.join(self.tmp_dir, "data", "update_data.py"), "w") as f:
+            f.write(FAKE_UPDATER)
+        self.patches = [patch.object(live_paper, 'BASE_DIR', self.tmp_dir),
+                        patch.object(live_paper, '_updater', None)]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in reversed(self.patches):
+            p.stop()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_failed_load_is_retried(self):
+        fail_flag = os.path.join(self.tmp_dir, "data", "fail")
+        open(fail_flag, "w").close()
+        with self.assertRaises(RuntimeError):
+            live_paper.update_parquet()
+        self.assertIsNone(live_paper._updater)
+
+        os.remove(fail_flag)
+        live_paper.update_parquet()
+        self.assertEqual(live_paper._updater.updated, [live_paper.PARQUET_FILE])
+        self.assertEqual(live_paper._updater.cache_dir, os.path.join(self.tmp_dir, "data", ".cache", "trades"))
+
+class TestLoadResampledData(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.parquet_file = os.path.join(self.tmp_dir, "ohlc.parquet")
+        rng = np.random.default_rng(5)
+        close = 50000 + np.cumsum(rng.normal(0, 50, 24 * 40))
+        self.candles = pd.DataFrame({
+            'Timestamp': pd.date_range("2024-03-01 07:00", periods=len(close), freq="h"),
+            'Open': close - rng.uniform(-20, 20, len(close)),
+            'High': close + rng.uniform(0, 40, len(close)),
+            'Low': close - rng.uniform(0, 40, len(close)),
+            'Close': close,
+            'Volume': rng.uniform(0, 10, len(close)),
+        })
+        self.patches = [patch.object(live_paper, 'PARQUET_FILE', self.parquet_file),
+                        patch.object(live_paper, '_last_mtime', None),
+                        patch.object(live_paper, '_cached_df_resampled', None),
+                        patch.object(live_paper, '_cached_interval', None)]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in reversed(self.patches):
+            p.stop()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def write_candles(self, rows, mtime_ns):
+        self.candles.iloc[:rows].to_parquet(self.parquet_file, index=False)
+        os.utime(self.parquet_file, ns=(mtime_ns, mtime_ns))
+
+    def test_incremental_load_matches_full_resample(self):
+        # 5h and 3D do not divide a day or a week, so their buckets depend on where they are
+        # anchored; weekly and month-end buckets are labelled by their right edge
+        for interval in ('1D', '4h', '5h', '3D', '1W', 'ME'):
+            live_paper._cached_df_resampled = None
+            self.write_candles(24 * 17 + 5, 1_000_000_000)
+            live_paper.load_resampled_data(interval)
+            self.write_candles(len(self.candles), 2_000_000_000)
+            incremental = live_paper.load_resampled_data(interval)
+
+            live_paper._cached_df_resampled = None
+            full = live_paper.load_resampled_data(interval)
+            self.assertGreater(len(full), 0)
+            pd.testing.assert_frame_equal(incremental, full, obj=interval)
+
+    def test_matches_backtest_candles(self):
+        self.write_candles(len(self.candles), 1_000_000_000)
+        for interval in ('1d', '5h', '3d'):
+            live_paper._cached_df_resampled = None
+            live = live_paper.load_resampled_data(interval)
+            backtest = DataHandler(self.parquet_file, "2024-03-01", "2024-12-31", interval).load_data()
+            pd.testing.assert_frame_equal(live, backtest, obj=interval)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,86 @@
+import unittest
+import pandas as pd
+from data import DataHandler
+from strategy import Strategy
+
+DATA_FILE = "data/ohlc_data_60min_all_years.parquet"
+
+# Low thresholds so every signal column fires on the fixture: the first configuration
+# exercises the supertrend exit, the second the plain MACD exit and the relaxed filters
+SIGNAL_CONFIGS = [
+    {"macd_threshold": 1, "supertrend_multiplier": 0.5},
+    {"macd_threshold": 0, "use_supertrend": False, "use_adx_positive": False,
+     "use_macd_positive": True, "lateral_adx_threshold": 30, "resistance_margin": 0.95},
+]
+
+class TestStrategyConfig(unittest.TestCase):
+    def test_default_config_is_read_only(self):
+        strategy = Strategy()
+        with self.assertRaises(TypeError):
+            strategy.config['sma_short'] = 1
+        self.assertIs(strategy.config, Strategy().config)
+
+    def test_overrides_are_coerced_per_instance(self):
+        default_sma_short = Strategy().config['sma_short']
+        strategy = Strategy({"sma_short": "10", "bollinger_std_dev": "2", "use_supertrend": False})
+        self.assertEqual(strategy.config['sma_short'], 10)
+        self.assertIsInstance(strategy.config['sma_short'], int)
+        self.assertEqual(strategy.config['bollinger_std_dev'], 2.0)
+        self.assertIsInstance(strategy.config['bollinger_std_dev'], float)
+        self.assertIs(strategy.config['use_supertrend'], False)
+        # Overrides stay on their own instance
+        strategy.config['sma_long'] = 500
+        other = Strategy({"sma_short": 20})
+        self.assertEqual(other.config['sma_long'], Strategy().config['sma_long'])
+        self.assertEqual(Strategy().config['sma_short'], default_sma_short)
+
+    def test_unknown_key_is_rejected(self):
+        with self.assertRaises(KeyError):
+            Strategy({"sma_shrot": 10})
+
+class TestComputeSignals(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.base_data = DataHandler(DATA_FILE, "2022-01-01", "2024-12-31", "1D").load_data()
+
+    def scalar_signals(self, strategy, data):
+        """
+        Evaluate entry_signal/exit_signal on every candle with a fresh position state.
+        The exit is taken with a position that cannot hit its trailing stop, stop-loss,
+        take-profit or time-based stop, which leaves the position-independent rules.
+        """
+        rows = []
+        for timestamp, row in data.iterrows():
+            strategy.position_open = False
+            entry = strategy.entry_signal(row, data)
+            range_entry = entry and strategy.is_range_trading
+
+            exits = []
+            for is_range_trading in (False, True):
+                strategy.position_open = True
+                strategy.is_range_trading = is_range_trading
+                strategy.entry_price = row['Close']
+                strategy.highest_price = row['Close']
+                strategy.last_entry_time = timestamp - pd.Timedelta(days=1000)
+                # exit_signal flags the row it is given, so each call gets its own copy
+                exits.append(strategy.exit_signal(row.copy(), data))
+            rows.append((entry, range_entry, exits[0], exits[1]))
+        return pd.DataFrame(rows, index=data.index, columns=['entry', 'range_entry', 'exit', 'range_exit'])
+
+    def test_matches_entry_and_exit_signal(self):
+        fired = pd.Series(False, index=['entry', 'range_entry', 'exit', 'range_exit'])
+        for config in SIGNAL_CONFIGS:
+            data = self.base_data.copy()
+            strategy = Strategy(config)
+            strategy.calculate_indicators(data)
+            signals = strategy.compute_signals(data)
+            expected = self.scalar_signals(Strategy(config), data)
+            for column in expected.columns:
+                mismatches = data.index[signals[column].to_numpy() != expected[column].to_numpy()]
+                self.assertEqual(len(mismatches), 0, f"{column} differs at {list(mismatches[:5])} ({config})")
+            fired |= expected.any()
+        # Both modes and every signal occur at least once on the fixture
+        self.assertTrue(fired.all(), fired.to_dict())
+
+if __name__ == '__main__':
+    unittest.main()
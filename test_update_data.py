@@ -0,0 +1,95 @@
+import importlib.util
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# data/ is not a package (and `data` is data.py), so the updater is loaded by path
+_spec = importlib.util.spec_from_file_location(
+    "update_data", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "update_data.py"))
+update_data = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(update_data)
+
+HOUR = 3600
+
+def make_trades(start, count, seed):
+    """
+    Kraken-style trades [price, volume, time, side, type, misc, id], one every 90 seconds.
+    """
+    rng = np.random.default_rng(seed)
+    prices = 50000 + np.cumsum(rng.normal(0, 20, count))
+    volumes = rng.uniform(0.001, 0.5, count)
+    return [[f"{prices[i]:.1f}", f"{volumes[i]:.8f}", start + 90.0 * i, "b", "m", "", i] for i in range(count)]
+
+def to_batch(trades):
+    return pa.RecordBatch.from_pandas(update_data.trades_to_ohlc(trades), preserve_index=False)
+
+class TestCombineAndSave(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.output_file = os.path.join(self.tmp_dir, "ohlc.parquet")
+        self.cache_patch = patch.object(update_data, "cache_dir", os.path.join(self.tmp_dir, "cache"))
+        self.cache_patch.start()
+        self.start = 1_700_000_000 - 1_700_000_000 % HOUR  # On an hour boundary
+
+    def tearDown(self):
+        self.cache_patch.stop()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_hour_split_across_downloads_is_merged(self):
+        trades = make_trades(self.start, 40, seed=1)  # One hour holds 40 trades
+        update_data.combine_and_save(pa.Table.from_batches([to_batch(trades[:15]), to_batch(trades[15:])]),
+                                     self.output_file)
+        saved = pd.read_parquet(self.output_file)
+        self.assertEqual(len(saved), 1)
+        prices = np.array([float(t[0]) for t in trades])
+        volumes = np.array([float(t[1]) for t in trades])
+        bar = saved.iloc[0]
+        self.assertEqual(bar["Timestamp"], pd.Timestamp(self.start, unit="s"))
+        self.assertEqual(bar["Open"], prices[0])
+        self.assertEqual(bar["High"], prices.max())
+        self.assertEqual(bar["Low"], prices.min())
+        self.assertEqual(bar["Close"], prices[-1])
+        self.assertAlmostEqual(bar["Volume"], volumes.sum(), places=12)
+        self.assertAlmostEqual(bar["VWAP"], (prices * volumes).sum() / volumes.sum(), places=6)
+        self.assertEqual(bar["Count"], 40)
+
+    def test_append_keeps_timestamps_sorted_and_unique(self):
+        trades = make_trades(self.start, 40 * 30, seed=2)  # 30 hours
+        # Small row groups, so the append goes through the copied row groups and the
+        # merged last row group
+        with patch.object(update_data, "ROW_GROUP_SIZE", 8):
+            update_data.combine_and_save(pa.Table.from_batches([to_batch(trades[:40 * 20])]), self.output_file)
+            # The second download starts inside hours the file already has
+            update_data.combine_and_save(pa.Table.from_batches([to_batch(trades[40 * 18:])]), self.output_file)
+        saved = pd.read_parquet(self.output_file)
+        expected = update_data.trades_to_ohlc(trades)
+        self.assertTrue(saved["Timestamp"].is_monotonic_increasing)
+        self.assertTrue(saved["Timestamp"].is_unique)
+        pd.testing.assert_series_equal(saved["Timestamp"], expected["Timestamp"])
+        pd.testing.assert_frame_equal(saved[["Open", "High", "Low", "Close", "Count"]],
+                                      expected[["Open", "High", "Low", "Close", "Count"]])
+        self.assertGreater(pq.ParquetFile(self.output_file).num_row_groups, 1)
+        self.assertFalse(os.path.exists(self.output_file + ".tmp"))
+
+    def test_get_last_timestamp_reads_appended_footer(self):
+        trades = make_trades(self.start, 40 * 30, seed=3)
+        with patch.object(update_data, "ROW_GROUP_SIZE", 8):
+            update_data.combine_and_save(pa.Table.from_batches([to_batch(trades[:40 * 20])]), self.output_file)
+            update_data.combine_and_save(pa.Table.from_batches([to_batch(trades[40 * 20:])]), self.output_file)
+        metadata = pq.ParquetFile(self.output_file).metadata
+        for i in range(metadata.num_row_groups):
+            self.assertTrue(metadata.row_group(i).column(0).statistics.has_min_max)
+        # The footer answer must not need the column read fallback
+        with patch.object(update_data.pd, "read_parquet", side_effect=AssertionError("column read")):
+            num_rows, last_timestamp = update_data.get_last_timestamp(self.output_file)
+        self.assertEqual(num_rows, 30)
+        self.assertEqual(last_timestamp, pd.Timestamp(self.start + 29 * HOUR, unit="s"))
+
+if __name__ == '__main__':
+    unittest.main()